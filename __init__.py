@@ -8,12 +8,12 @@
 """
 import pygame
 
-from typedefs import ColorChar
 from chessGamePlay import Game
 from chessPlayer import (
     Human,
-    RandomComp
+    SearchComp
 )
+from chessSearch import SearchLimits
 from chessBoardDisplay import Board
 
 import gui.image
@@ -27,8 +27,8 @@ DISPLAY_HEIGHT = 800
 if __name__ == '__main__':
     window = Display(DISPLAY_WIDTH, DISPLAY_HEIGHT)
 
-    user = Human(ColorChar.WHITE)
-    comp = RandomComp(ColorChar.BLACK)
+    user = Human('player')
+    comp = SearchComp('computer', limits=SearchLimits(moveTime=2.0), ponder=True)
     game = Game(user, comp)
 
     boardImage = gui.image.loadImage('images/chess_board.png')
@@ -42,4 +42,5 @@ if __name__ == '__main__':
         game.update()
         window.tick()
 
+    game.close()
     pygame.quit()
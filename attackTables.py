@@ -0,0 +1,99 @@
+#!/bin/python3
+# attackTables.py
+
+"""
+Per-square lookup tables for the 8x8 board, built once when the module is imported.
+
+All tables hold bitboards (see bitboard.py) indexed by square number:
+  KNIGHT_ATTACKS[sq], KING_ATTACKS[sq] -- squares a knight / king on sq attacks
+  PAWN_ATTACKS[color][sq] -- squares a pawn of that color on sq attacks
+  PAWN_PUSHES[color][sq] -- the square a pawn of that color on sq moves to
+  RAYS[dir][sq] -- every square from sq to the edge in one direction (empty board)
+  BETWEEN[a][b] -- squares strictly between a and b if they share a line, else 0
+  LINE[a][b] -- the whole line through a and b (edge to edge) if they share one, else 0
+
+Move generation and attack detection index into these instead of walking
+direction vectors and bounds checks on every call.
+"""
+
+from typedefs import ColorChar
+import bitboard
+from bitboard import NUM_SQUARES, FULL
+
+# Rook directions are RAYS[0:4], bishop directions RAYS[4:8]
+DIRECTIONS = bitboard.ORTHOGONAL_DIRECTIONS + bitboard.DIAGONAL_DIRECTIONS
+
+
+def _buildRays() -> list[list[int]]:
+    rays = []
+    for direction in DIRECTIONS:
+        rays.append([bitboard.slide(bitboard.bit(square), FULL, direction)
+                     for square in range(NUM_SQUARES)])
+    return rays
+
+
+def _buildBetweenAndLine() -> tuple[list[list[int]], list[list[int]]]:
+    between = [[0] * NUM_SQUARES for _ in range(NUM_SQUARES)]
+    line = [[0] * NUM_SQUARES for _ in range(NUM_SQUARES)]
+
+    # directions come in opposite pairs within each group of four
+    opposite = {0: 1, 1: 0, 2: 3, 3: 2, 4: 7, 5: 6, 6: 5, 7: 4}
+    for index in range(len(DIRECTIONS)):
+        for square in range(NUM_SQUARES):
+            fullLine = RAYS[index][square] | RAYS[opposite[index]][square] | bitboard.bit(square)
+            for other in bitboard.iterSquares(RAYS[index][square]):
+                between[square][other] = RAYS[index][square] & RAYS[opposite[index]][other]
+                line[square][other] = fullLine
+
+    return between, line
+
+
+KNIGHT_ATTACKS = [bitboard.knightAttacks(bitboard.bit(square)) for square in range(NUM_SQUARES)]
+KING_ATTACKS = [bitboard.kingAttacks(bitboard.bit(square)) for square in range(NUM_SQUARES)]
+PAWN_ATTACKS = {
+    color: [bitboard.pawnAttacks(bitboard.bit(square), color) for square in range(NUM_SQUARES)]
+    for color in ColorChar
+}
+PAWN_PUSHES = {
+    color: [bitboard.pawnPushes(bitboard.bit(square), color) for square in range(NUM_SQUARES)]
+    for color in ColorChar
+}
+
+RAYS = _buildRays()
+BETWEEN, LINE = _buildBetweenAndLine()
+
+# Rays along which the nearest blocker is the lowest set bit (directions towards h1)
+_INCREASING = tuple(direction[0] > 0 for direction in DIRECTIONS)
+
+# Every square a rook / bishop on sq could reach on an empty board
+ROOK_RAYS = [RAYS[0][sq] | RAYS[1][sq] | RAYS[2][sq] | RAYS[3][sq] for sq in range(NUM_SQUARES)]
+BISHOP_RAYS = [RAYS[4][sq] | RAYS[5][sq] | RAYS[6][sq] | RAYS[7][sq] for sq in range(NUM_SQUARES)]
+
+
+def rayAttacks(square: int, occupied: int, index: int) -> int:
+    """Squares attacked from square along one direction, up to and including the
+    first occupied square
+    """
+    ray = RAYS[index][square]
+    blockers = ray & occupied
+    if not blockers:
+        return ray
+    if _INCREASING[index]:
+        first = (blockers & -blockers).bit_length() - 1
+    else:
+        first = blockers.bit_length() - 1
+    return ray ^ RAYS[index][first]
+
+
+def rookAttacks(square: int, occupied: int) -> int:
+    """Squares a rook on square attacks given the board occupancy"""
+
+    return rayAttacks(square, occupied, 0) | rayAttacks(square, occupied, 1) \
+        | rayAttacks(square, occupied, 2) | rayAttacks(square, occupied, 3)
+
+
+def bishopAttacks(square: int, occupied: int) -> int:
+    """Squares a bishop on square attacks given the board occupancy"""
+
+    return rayAttacks(square, occupied, 4) | rayAttacks(square, occupied, 5) \
+        | rayAttacks(square, occupied, 6) | rayAttacks(square, occupied, 7)
@@ -0,0 +1,153 @@
+#!/bin/python3
+# bitboard.py
+
+"""
+Helpers for bitboards: 64-bit integers holding one bit per square of the board.
+
+Squares are numbered row * 8 + col, so a8 (0, 0) is bit 0 and h1 (7, 7) is bit 63.
+This keeps the same orientation as the (row, col) coordinates used everywhere
+else: "north" (towards black's side) is a smaller square number.
+
+Everything here works set-wise: a whole bitboard of pieces is shifted or filled at
+once, so the attacks of every knight (or every rook) come out of a handful of
+integer operations instead of a loop over squares.
+"""
+
+from typing import Iterator
+
+from typedefs import ColorChar, Coord
+
+NUM_ROWS = 8
+NUM_COLS = 8
+NUM_SQUARES = NUM_ROWS * NUM_COLS
+
+EMPTY = 0
+FULL = (1 << NUM_SQUARES) - 1
+
+FILE_A = 0x0101010101010101
+FILE_B = FILE_A << 1
+FILE_G = FILE_A << 6
+FILE_H = FILE_A << 7
+NOT_FILE_A = FULL ^ FILE_A
+NOT_FILE_H = FULL ^ FILE_H
+NOT_FILE_AB = FULL ^ (FILE_A | FILE_B)
+NOT_FILE_GH = FULL ^ (FILE_G | FILE_H)
+
+ROW_0 = 0xFF
+ROW_7 = ROW_0 << (8 * (NUM_ROWS - 1))
+
+# (shift, wrap mask) for each direction. A positive shift moves towards h1.
+NORTH = (-8, FULL)
+SOUTH = (8, FULL)
+EAST = (1, NOT_FILE_A)
+WEST = (-1, NOT_FILE_H)
+NORTH_EAST = (-7, NOT_FILE_A)
+NORTH_WEST = (-9, NOT_FILE_H)
+SOUTH_EAST = (9, NOT_FILE_A)
+SOUTH_WEST = (7, NOT_FILE_H)
+
+ORTHOGONAL_DIRECTIONS = (NORTH, SOUTH, EAST, WEST)
+DIAGONAL_DIRECTIONS = (NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST)
+
+
+def squareIndex(row: int, col: int) -> int:
+    """Converts a (row, col) coordinate to its square number"""
+
+    return row * NUM_COLS + col
+
+
+def squareCoord(square: int) -> Coord:
+    """Converts a square number to its (row, col) coordinate"""
+
+    return divmod(square, NUM_COLS)
+
+
+def bit(square: int) -> int:
+    """Returns the bitboard with only the given square set"""
+
+    return 1 << square
+
+
+def popCount(bb: int) -> int:
+    """Returns the number of squares set in the bitboard"""
+
+    return bb.bit_count()
+
+
+def lowestSquare(bb: int) -> int:
+    """Returns the smallest square number set in a non-empty bitboard"""
+
+    return (bb & -bb).bit_length() - 1
+
+
+def iterSquares(bb: int) -> Iterator[int]:
+    """Generator of the square numbers set in the bitboard, in increasing order"""
+
+    while bb:
+        low = bb & -bb
+        yield low.bit_length() - 1
+        bb ^= low
+
+
+def shift(bb: int, direction: tuple[int, int]) -> int:
+    """Moves every square of the bitboard one step in the given direction"""
+
+    amount, mask = direction
+    if amount > 0:
+        return (bb << amount) & mask & FULL
+    return (bb >> -amount) & mask
+
+
+def slide(bb: int, empty: int, direction: tuple[int, int]) -> int:
+    """Returns the squares attacked by sliding every piece in bb along direction
+
+    Uses a Kogge-Stone occluded fill: the ray stops on the first occupied square,
+    which is itself included (it may be a capture, or a defended piece).
+    """
+    amount, mask = direction
+    propagate = empty & mask
+    bb |= propagate & _rawShift(bb, amount)
+    propagate &= _rawShift(propagate, amount)
+    bb |= propagate & _rawShift(bb, 2 * amount)
+    propagate &= _rawShift(propagate, 2 * amount)
+    bb |= propagate & _rawShift(bb, 4 * amount)
+    return _rawShift(bb, amount) & mask
+
+
+def _rawShift(bb: int, amount: int) -> int:
+    if amount > 0:
+        return (bb << amount) & FULL
+    return bb >> -amount
+
+
+def knightAttacks(knights: int) -> int:
+    """Returns every square attacked by the knights in the bitboard"""
+
+    east1 = (knights << 1) & NOT_FILE_A
+    west1 = (knights >> 1) & NOT_FILE_H
+    east2 = (knights << 2) & NOT_FILE_AB
+    west2 = (knights >> 2) & NOT_FILE_GH
+    oneCol = east1 | west1
+    twoCols = east2 | west2
+    return ((oneCol << 16) | (oneCol >> 16) | (twoCols << 8) | (twoCols >> 8)) & FULL
+
+
+def kingAttacks(kings: int) -> int:
+    """Returns every square attacked by the kings in the bitboard"""
+
+    row = kings | ((kings << 1) & NOT_FILE_A) | ((kings >> 1) & NOT_FILE_H)
+    return (row | (row << 8) | (row >> 8)) & FULL & ~kings
+
+
+def pawnAttacks(pawns: int, color: ColorChar) -> int:
+    """Returns every square attacked by the pawns of the given color"""
+
+    if color == ColorChar.WHITE:
+        return shift(pawns, NORTH_EAST) | shift(pawns, NORTH_WEST)
+    return shift(pawns, SOUTH_EAST) | shift(pawns, SOUTH_WEST)
+
+
+def pawnPushes(pawns: int, color: ColorChar) -> int:
+    """Moves every pawn of the given color one square forward (ignoring blockers)"""
+
+    return shift(pawns, NORTH if color == ColorChar.WHITE else SOUTH)
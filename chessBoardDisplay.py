@@ -130,7 +130,7 @@ class Board(Container):
             if selectedPiece is not None:
                 assert isinstance(self._tempMove, PawnPromotion)
                 self._tempMove.toPiece = selectedPiece  # altering the actual move that player selcts
-                self._player.selectedMove = self._tempMove
+                self._player.selectMove(self._tempMove)
                 self._tempMove = None
                 self._promoting = False
                 self._promotionPopup.selectedPiece = None
@@ -190,6 +190,10 @@ class Board(Container):
             return True
 
         if not self._promoting:
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_BACKSPACE:
+                self._takeback()
+                return True
+
             if event.type == pygame.MOUSEMOTION:
                 self._onMouseMove(event)
                 return True
@@ -228,9 +232,16 @@ class Board(Container):
                     # self._player.selectedMove = promotionMoves[0]  
 
                 else:
-                    self._player.selectedMove = selectedMove
+                    self._player.selectMove(selectedMove)
             self._selectedSquare = None
 
+    def _takeback(self):
+        # back to the human's last turn: on the human's turn that is two moves ago,
+        # while the computer is thinking it is the move just made
+        humanToMove = self._game.players[self._position.toMove] is self._player
+        self._game.takeback(2 if humanToMove else 1)
+        self._selectedSquare = None
+
     def _screenPosToCoord(self, x: int, y: int) -> Coord:
         col = x // self._cellSize
         row = y // self._cellSize
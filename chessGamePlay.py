@@ -1,4 +1,5 @@
 
+from concurrent.futures import Future
 from typing import Iterator
 from typedefs import ColorChar, PositionStatus, Outcome
 from chessMove import Move
@@ -14,6 +15,7 @@ class Game:
     position: Position
 
     _legalMoves: (list[Move] | None)
+    _request: (Future | None)   # the active player's pending move decision
 
     def __init__(self,
                  whitePlayer: Player,
@@ -26,20 +28,54 @@ class Game:
         self.position = Position(startPos)
 
         self._legalMoves = None
+        self._request = None
 
     def update(self):
         """Checks if the active player has selected
-        their move, and if so, executes it
+        their move, and if so, executes it. Never waits: a player still
+        deciding (see Player.requestMove) is simply checked again next time.
         """
         if self._legalMoves is None:
             self._legalMoves = self.position.getLegalMoves(self.position.toMove)
 
-        activePlayer = self.players[self.position.toMove]
-        move = activePlayer.decideMove(self.position, self._legalMoves)
+        if self._request is None:
+            activePlayer = self.players[self.position.toMove]
+            waitingPlayer = self.players[self.position.toMove.opponent]
+            if waitingPlayer is not activePlayer:
+                waitingPlayer.ponder(self.position)
+            self._request = activePlayer.requestMove(self.position, self._legalMoves)
+        if not self._request.done():
+            return
+
+        request = self._request
+        self._request = None
+        move = None if request.cancelled() else request.result()
         if move is not None:
             self.position.executeMove(move)
             self._legalMoves = None
 
+    def takeback(self, plies: int = 1):
+        """Abandons the move being decided and takes back up to the given number
+        of moves
+        """
+        self._cancelRequest()
+        for _ in range(min(plies, self.position.movesMade)):
+            self.position.unmakeMove()
+        self._legalMoves = None
+
+    def close(self):
+        """Stops any player still deciding and shuts down their worker threads"""
+
+        self._cancelRequest()
+        for player in self.players.values():
+            player.close()
+
+    def _cancelRequest(self):
+        # the waiting player's pondering is stopped too, as it assumed this position
+        for player in self.players.values():
+            player.cancelMove()
+        self._request = None
+
 
 
 class AI_Game: 
@@ -66,24 +102,25 @@ class AI_Game:
     def playGame(self) -> tuple[(Outcome | None), (PositionStatus | None), (str | None)]: 
         """Function that plays out the game outcome and the PGN of the game."""  
 
-        if self.position.getPositionStatus == PositionStatus.INVALID: 
-            return (None, None) 
+        if self.position.getPositionStatus() == PositionStatus.INVALID: 
+            return (None, PositionStatus.INVALID, None) 
 
         self.PGN = '[FEN "{}"]\n'.format(self.position.fenStr)
        
 
         tempcount = 0
         tempcountLimit = 1000
-        while self.position.getPositionStatus() == PositionStatus.IN_PLAY and tempcount < tempcountLimit :
+        moves = self.position.getLegalMoves(self.position.toMove)
+        while self.position.getPositionStatus(moves) == PositionStatus.IN_PLAY and tempcount < tempcountLimit :
             activePlayer = self.players[self.position.toMove]
-            moves = self.position.getLegalMoves(self.position.toMove)
             nextMove  = activePlayer.decideMove(self.position, moves) 
            
             if self.position.toMove == ColorChar.WHITE: 
                 self.PGN += ' {}.'.format(self.position.fullMoveNumber)  
 
-            self.PGN += ' ' + self.position.moveToAlgebraic(nextMove) 
+            self.PGN += ' ' + self.position.moveToAlgebraic(nextMove)
             self.position.executeMove(nextMove) 
+            moves = self.position.getLegalMoves(self.position.toMove)
 
             tempcount += 1
 
@@ -93,7 +130,7 @@ class AI_Game:
             print( self.PGN ) 
 
 
-        positionStatus = self.position.getPositionStatus() 
+        positionStatus = self.position.getPositionStatus(moves) 
         self.outcome = positionStatus.result
         self.positionStatus = positionStatus
 
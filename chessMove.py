@@ -10,6 +10,8 @@ end -- where the piece ends
 """
 
 from typedefs import PieceChar, Coord
+from fen import coordToSquare
+from bitboard import squareIndex, squareCoord
 
 
 class Move:
@@ -22,6 +24,11 @@ class Move:
     def __str__(self):
         return f"Piece moves from {self.begin} to {self.end}"
 
+    def toCoordinateNotation(self) -> str:
+        """The move as its start and end squares, e.g. e2e4"""
+
+        return coordToSquare(self.begin) + coordToSquare(self.end)
+
 
 class Capture(Move):
     """A capture of another piece"""
@@ -62,6 +69,11 @@ class PawnPromotion(Move):
     def __str__(self):
         return super().__str__() + " as a pawn promotion to " + str(self.toPiece) 
 
+    def toCoordinateNotation(self) -> str:
+        """The move as its start and end squares plus the promotion piece, e.g. e7e8q"""
+
+        return super().toCoordinateNotation() + self.toPiece.value
+
 
 class PromotionByPush(PawnPromotion, PawnPush):
     """A pawn promotion by simple movement"""
@@ -82,3 +94,119 @@ class Castle(Move):
 
     def __str__(self):
         return super().__str__() + ' as in castling '
+
+
+# Packed moves ----------------------------------------------------------------
+#
+# Inside the engine a move is a 16-bit integer rather than one of the classes
+# above: bits 0-5 hold the start square, bits 6-11 the end square (numbered as
+# in bitboard.squareIndex) and bits 12-15 one of the flags below. The flags put
+# captures in bit 14 and promotions in bit 15, so those tests are one AND.
+# encodeMove / decodeMove convert at the API boundary.
+
+QUIET = 0
+DOUBLE_PUSH = 1
+KING_CASTLE = 2
+QUEEN_CASTLE = 3
+CAPTURE = 4
+EP_CAPTURE = 5
+PROMOTION = 8               # + index into PROMOTION_PIECES
+PROMOTION_CAPTURE = 12      # + index into PROMOTION_PIECES
+
+PROMOTION_PIECES = (PieceChar.KNIGHT, PieceChar.BISHOP, PieceChar.ROOK, PieceChar.QUEEN)
+
+CAPTURE_BIT = CAPTURE << 12
+PROMOTION_BIT = PROMOTION << 12
+NULL_MOVE = 0
+
+
+def packMove(start: int, end: int, flag: int = QUIET) -> int:
+    """Packs start and end square numbers and a flag into a 16-bit move"""
+
+    return start | (end << 6) | (flag << 12)
+
+
+def moveStart(code: int) -> int:
+    """The start square of a packed move"""
+
+    return code & 0x3F
+
+
+def moveEnd(code: int) -> int:
+    """The end square of a packed move"""
+
+    return (code >> 6) & 0x3F
+
+
+def moveFlag(code: int) -> int:
+    """The flag of a packed move"""
+
+    return code >> 12
+
+
+def isCapture(code: int) -> bool:
+    """Whether the packed move captures (en passant included)"""
+
+    return bool(code & CAPTURE_BIT)
+
+
+def isPromotion(code: int) -> bool:
+    """Whether the packed move promotes a pawn"""
+
+    return bool(code & PROMOTION_BIT)
+
+
+def promotionPiece(code: int) -> PieceChar:
+    """The piece a packed promotion turns the pawn into"""
+
+    return PROMOTION_PIECES[(code >> 12) & 3]
+
+
+def encodeMove(move: Move) -> int:
+    """Packs a move object into its 16-bit form"""
+
+    start = squareIndex(*move.begin)
+    end = squareIndex(*move.end)
+
+    if isinstance(move, PawnPromotion):
+        flag = PROMOTION_CAPTURE if isinstance(move, Capture) else PROMOTION
+        flag += PROMOTION_PIECES.index(move.toPiece)
+    elif isinstance(move, EnPassant):
+        flag = EP_CAPTURE
+    elif isinstance(move, Capture):
+        flag = CAPTURE
+    elif isinstance(move, Castle):
+        flag = KING_CASTLE if move.end[1] > move.begin[1] else QUEEN_CASTLE
+    elif isinstance(move, PawnDoublePush):
+        flag = DOUBLE_PUSH
+    else:
+        flag = QUIET
+
+    return packMove(start, end, flag)
+
+
+def decodeMove(code: int, pawnMove: bool = False) -> Move:
+    """Unpacks a 16-bit move into the matching move object.
+
+    A quiet pawn push and a quiet piece move share a flag, so pawnMove says which
+    one a quiet move is (Position.decodeMove fills it in from the board).
+    """
+    begin = squareCoord(moveStart(code))
+    end = squareCoord(moveEnd(code))
+    flag = moveFlag(code)
+
+    if flag >= PROMOTION_CAPTURE:
+        return PromotionByCapture(begin, end, promotionPiece(code))
+    if flag >= PROMOTION:
+        return PromotionByPush(begin, end, promotionPiece(code))
+    if flag == EP_CAPTURE:
+        return EnPassant(begin, end)
+    if flag == CAPTURE:
+        return Capture(begin, end)
+    if flag in (KING_CASTLE, QUEEN_CASTLE):
+        return Castle(begin, end)
+    if flag == DOUBLE_PUSH:
+        return PawnDoublePush(begin, end)
+    if pawnMove:
+        return PawnPush(begin, end)
+    return Move(begin, end)
@@ -11,6 +11,14 @@ Attributes:
   maxRange -- how far the piece can move in each of those directions
     ** special for pawns -- capDirection, capMaxRange for capture directions
                             specialDirection, specialStep for initial double step
+
+There is exactly one object per piece type and color: King(ColorChar.WHITE)
+always returns the same white king. The objects are immutable and carry no
+per-instance state beyond their color and code, so boards can share them freely.
+
+Inside the engine the board holds small integer codes instead of objects: the
+piece type (PAWN ... KING) in the low three bits and BLACK_BIT for black pieces,
+with EMPTY for an empty square. PIECES[code] gives back the piece object.
 """
 
 from abc import ABC, abstractmethod
@@ -23,28 +31,65 @@ from typedefs import (
 
 MAX_RANGE = -1
 
+# integer piece codes
+EMPTY = 0
+PAWN = 1
+KNIGHT = 2
+BISHOP = 3
+ROOK = 4
+QUEEN = 5
+KING = 6
+TYPE_MASK = 7
+BLACK_BIT = 8
+NUM_CODES = 16
+
+COLOR_BITS = {ColorChar.WHITE: 0, ColorChar.BLACK: BLACK_BIT}
+COLOR_INDEX = {ColorChar.WHITE: 0, ColorChar.BLACK: 1}    # == code >> 3
+COLORS = (ColorChar.WHITE, ColorChar.BLACK)
+
 
 class Piece(ABC):
     """A generic chess piece"""
 
+    __slots__ = ('color', 'code')
+
     char: PieceChar
+    typeCode: int
+    value: int = 1
+
     color: ColorChar
-    value: int
+    code: int
 
-    def __init__(self, char: PieceChar, color: ColorChar):
+    _instances: dict[ColorChar, 'Piece']
+
+    def __new__(cls, color: ColorChar):
         """
         Args:
-            char (str): the color of the piece ('w' or 'b')
-            color (str): the FEN representation of the piece ('k', 'q', 'b', 'n', 'r', or 'p')
+            color (ColorChar): the color of the piece
         """
-        self.char = char
-        self.color = color
-        self.value = 1
+        piece = cls._instances.get(color)
+        if piece is None:
+            piece = super().__new__(cls)
+            object.__setattr__(piece, 'color', color)
+            object.__setattr__(piece, 'code', cls.typeCode | COLOR_BITS[color])
+            cls._instances[color] = piece
+        return piece
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._instances = {}
+
+    def __setattr__(self, name, value):
+        raise Exception(f"{type(self).__name__} pieces are immutable!")
+
+    def __reduce__(self):
+        # copies and unpickled pieces resolve back to the shared object
+        return (type(self), (self.color,))
 
     @property
     @abstractmethod
-    def moveDirection(self) -> list[Vector]:
-        """A list of directions the piece can move"""
+    def moveDirection(self) -> tuple[Vector, ...]:
+        """The directions the piece can move"""
 
     @property
     @abstractmethod
@@ -52,8 +97,8 @@ class Piece(ABC):
         """The maximum number of squares the piece can move"""
 
     @property
-    def attackDirection(self) -> list[Vector]:
-        """A list of directions the piece can capture"""
+    def attackDirection(self) -> tuple[Vector, ...]:
+        """The directions the piece can capture"""
 
         return self.moveDirection
 
@@ -71,25 +116,27 @@ class Piece(ABC):
 class Pawn(Piece):
     """A chess pawn"""
 
-    def __init__(self, color: ColorChar):
-        super().__init__(PieceChar.PAWN, color)
+    __slots__ = ()
+
+    char = PieceChar.PAWN
+    typeCode = PAWN
+
+    # a8 is (0, 0) so white pawns move in -y direction
+    MOVE_DIRECTION = {ColorChar.WHITE: ((-1, 0),), ColorChar.BLACK: ((1, 0),)}
+    ATTACK_DIRECTION = {ColorChar.WHITE: ((-1, -1), (-1, 1)),
+                        ColorChar.BLACK: ((1, -1), (1, 1))}
 
     @property
-    def moveDirection(self) -> list[Vector]:
-        # a8 is (0, 0) so white pawns move in -y direction
-        if self.color == ColorChar.WHITE:
-            return [(-1, 0)]
-        return [(1, 0)]
+    def moveDirection(self) -> tuple[Vector, ...]:
+        return self.MOVE_DIRECTION[self.color]
 
     @property
     def moveRange(self) -> int:
         return 1
 
     @property
-    def attackDirection(self) -> list[Vector]:
-        if self.color == ColorChar.WHITE:
-            return [(-1, -1), (-1, 1)]
-        return [(1, -1), (1, 1)]
+    def attackDirection(self) -> tuple[Vector, ...]:
+        return self.ATTACK_DIRECTION[self.color]
 
     @property
     def attackRange(self) -> int:
@@ -99,14 +146,18 @@ class Pawn(Piece):
 class Knight(Piece):
     """A chess knight"""
 
-    def __init__(self, color: ColorChar):
-        super().__init__(PieceChar.KNIGHT, color)
-        self.value = 3
+    __slots__ = ()
+
+    char = PieceChar.KNIGHT
+    typeCode = KNIGHT
+    value = 3
+
+    MOVE_DIRECTION = ((-1, 2), (1, 2), (2, 1), (2, -1),
+                      (1, -2), (-1, -2), (-2, -1), (-2, 1))
 
     @property
-    def moveDirection(self) -> list[Vector]:
-        return [(-1, 2), (1, 2), (2, 1), (2, -1),
-                (1, -2), (-1, -2), (-2, -1), (-2, 1)]
+    def moveDirection(self) -> tuple[Vector, ...]:
+        return self.MOVE_DIRECTION
 
     @property
     def moveRange(self) -> int:
@@ -116,13 +167,17 @@ class Knight(Piece):
 class Bishop(Piece):
     """A chess bishop"""
 
-    def __init__(self, color: ColorChar):
-        super().__init__(PieceChar.BISHOP, color)
-        self.value = 3
+    __slots__ = ()
+
+    char = PieceChar.BISHOP
+    typeCode = BISHOP
+    value = 3
+
+    MOVE_DIRECTION = ((1, 1), (1, -1), (-1, -1), (-1, 1))
 
     @property
-    def moveDirection(self) -> list[Vector]:
-        return [(1, 1), (1, -1), (-1, -1), (-1, 1)]
+    def moveDirection(self) -> tuple[Vector, ...]:
+        return self.MOVE_DIRECTION
 
     @property
     def moveRange(self) -> int:
@@ -132,13 +187,17 @@ class Bishop(Piece):
 class Rook(Piece):
     """A chess rook"""
 
-    def __init__(self, color: ColorChar):
-        super().__init__(PieceChar.ROOK, color)
-        self.value = 5
+    __slots__ = ()
+
+    char = PieceChar.ROOK
+    typeCode = ROOK
+    value = 5
+
+    MOVE_DIRECTION = ((-1, 0), (1, 0), (0, -1), (0, 1))
 
     @property
-    def moveDirection(self) -> list[Vector]:
-        return [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    def moveDirection(self) -> tuple[Vector, ...]:
+        return self.MOVE_DIRECTION
 
     @property
     def moveRange(self) -> int:
@@ -148,14 +207,17 @@ class Rook(Piece):
 class Queen(Piece):
     """A chess queen"""
 
-    def __init__(self, color: ColorChar):
-        super().__init__(PieceChar.QUEEN, color)
-        self.value = 9
+    __slots__ = ()
+
+    char = PieceChar.QUEEN
+    typeCode = QUEEN
+    value = 9
+
+    MOVE_DIRECTION = Bishop.MOVE_DIRECTION + Rook.MOVE_DIRECTION
 
     @property
-    def moveDirection(self) -> list[Vector]:
-        return [(1, 1), (1, -1), (-1, -1), (-1, 1),
-                (-1, 0), (1, 0), (0, -1), (0, 1)]
+    def moveDirection(self) -> tuple[Vector, ...]:
+        return self.MOVE_DIRECTION
 
     @property
     def moveRange(self) -> int:
@@ -165,15 +227,38 @@ class Queen(Piece):
 class King(Piece):
     """A chess king"""
 
-    def __init__(self, color: ColorChar):
-        super().__init__(PieceChar.KING, color)
-        self.value = 0
+    __slots__ = ()
+
+    char = PieceChar.KING
+    typeCode = KING
+    value = 0
+
+    MOVE_DIRECTION = Queen.MOVE_DIRECTION
 
     @property
-    def moveDirection(self) -> list[Vector]:
-        return [(1, 1), (1, -1), (-1, -1), (-1, 1),
-                (-1, 0), (1, 0), (0, -1), (0, 1)]
+    def moveDirection(self) -> tuple[Vector, ...]:
+        return self.MOVE_DIRECTION
 
     @property
     def moveRange(self) -> int:
         return 1
+
+
+PIECE_CLASSES: dict[PieceChar, type[Piece]] = {
+    cls.char: cls for cls in (Pawn, Knight, Bishop, Rook, Queen, King)
+}
+
+# code -> piece object (None for EMPTY and unused codes)
+PIECES: list[(Piece | None)] = [None] * NUM_CODES
+for _cls in PIECE_CLASSES.values():
+    for _color in ColorChar:
+        PIECES[_cls(_color).code] = _cls(_color)
+
+# code -> value, so material can be summed without touching the objects
+PIECE_VALUES = [0 if piece is None else piece.value for piece in PIECES]
+
+
+def codeColor(code: int) -> ColorChar:
+    """Returns the color of a (non-empty) piece code"""
+
+    return COLORS[code >> 3]
@@ -5,15 +5,32 @@
 
 """
 Class devoted to defining a player and the subclasses. It will include method for deciding moves.
+
+Players decide in one of two ways. decideMove answers on the spot (or returns
+None to be asked again), which is what AI_Game uses. requestMove starts the
+decision and returns a Future instead, which Game polls once per frame so the
+window keeps running while a player thinks: a human's future resolves when the
+board reports a click, a searching computer's when its search, run in a
+worker thread on a copy of the position, finishes. cancelMove abandons a
+pending request, e.g. on a takeback.
+
+Game also calls ponder on the player waiting for its opponent, so it can think
+on the opponent's time: SearchComp then searches the reply it expects, and
+keeps that search going if the opponent does play it.
 """
 
 import random
+import threading
+import time
+from functools import partial
 from abc import ABC, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from typedefs import ColorChar
 from chessPosition import Position
-from chessMove import Move
+from chessMove import Move, encodeMove, NULL_MOVE
 from chessPiece import Piece
+from chessSearch import Searcher, SearchLimits, SearchResult, DEFAULT_DEPTH
 
 BoardArray = list[list[(Piece | None)]]
 
@@ -39,6 +56,34 @@ class Player(ABC):
             the selected move, or None if a move has not been decided on
         """
 
+    def requestMove(self,
+                    board: Position,
+                    possMoves: list[Move]) -> Future:
+        """Starts the player's move decision without waiting for it to finish.
+        By default the decision is made on the spot with decideMove.
+
+        Returns:
+            a Future of the selected move (None if no move was decided on)
+        """
+        request = Future()
+        request.set_result(self.decideMove(board, possMoves))
+        return request
+
+    def cancelMove(self):
+        """Abandons the decision started by requestMove, if it is still pending,
+        and any pondering
+        """
+
+    def ponder(self, board: Position):
+        """Called when the opponent starts deciding on its move in the given
+        position; the player may think ahead in the meantime
+        """
+
+    def close(self):
+        """Stops any pending decision and releases the player's worker threads"""
+
+        self.cancelMove()
+
     def __str__(self):
         return "Player ({})".format(self.nickname) 
 
@@ -54,9 +99,12 @@ class Human(Player):
     availableMoves: list[Move]
     selectedMove: (Move | None)
 
-    def __init__(self):
-        super().__init__()
+    _request: (Future | None)
+
+    def __init__(self, nickname: str = 'unnamed'):
+        super().__init__(nickname)
         self.selectedMove = None
+        self._request = None
 
     def decideMove(self,
                    board: BoardArray,
@@ -68,6 +116,28 @@ class Human(Player):
             self.selectedMove = None
         return move
 
+    def requestMove(self,
+                    board: Position,
+                    possMoves: list[Move]) -> Future:
+        self.cancelMove()
+        self.availableMoves = possMoves
+        self._request = Future()
+        return self._request
+
+    def selectMove(self, move: Move):
+        """Hands over the move the user chose (called by the board)"""
+
+        if self._request is not None and not self._request.done():
+            self._request.set_result(move)
+            self._request = None
+        else:
+            self.selectedMove = move
+
+    def cancelMove(self):
+        if self._request is not None:
+            self._request.cancel()
+            self._request = None
+
     def __str__(self):
         return super().__str__() + " is human."
 
@@ -82,3 +152,177 @@ class RandomComp(Player):
 
     def __str__(self):
         return super().__str__() + " is random computer."
+
+
+class SearchComp(Player):
+    """A computer player that picks its move with an alpha-beta search (see chessSearch)"""
+
+    searcher: Searcher
+    limits: (SearchLimits | None)
+    lastResult: (SearchResult | None)
+    ponderEnabled: bool
+    ponderHits: int
+    ponderMisses: int
+
+    _executor: (ThreadPoolExecutor | None)  # started with the first requestMove
+    _request: (Future | None)
+    _stopEvent: (threading.Event | None)    # stops the search behind _request
+
+    _ponderRequest: (Future | None)         # of the ponder search's SearchResult
+    _ponderStop: (threading.Event | None)
+    _ponderHit: (threading.Event | None)
+    _ponderKey: int                         # zobristKey of the position pondered on
+
+    def __init__(self, nickname: str = 'unnamed', maxDepth: int = DEFAULT_DEPTH,
+                 limits: (SearchLimits | None) = None, ponder: bool = False):
+        """
+        Args:
+            nickname (str): the player's name
+            maxDepth (int): plies to search when no limits are given
+            limits (SearchLimits): bounds on each move's search, e.g. a time per move
+            ponder (bool): whether to think on the opponent's time in a Game
+        """
+        super().__init__(nickname)
+        self.searcher = Searcher(maxDepth)
+        self.limits = limits
+        self.lastResult = None
+        self.ponderEnabled = ponder
+        self.ponderHits = 0
+        self.ponderMisses = 0
+        self._executor = None
+        self._request = None
+        self._stopEvent = None
+        self._ponderRequest = None
+        self._ponderStop = None
+        self._ponderHit = None
+        self._ponderKey = 0
+
+    def decideMove(self,
+                   board: Position,
+                   possMoves: list[Move]) -> (Move | None):
+        return self._searchMove(board, possMoves, None)
+
+    def requestMove(self,
+                    board: Position,
+                    possMoves: list[Move]) -> Future:
+        """Starts a search on a copy of the board in the player's worker thread,
+        or carries on the ponder search if the opponent played the expected move
+        """
+        ponderRequest, ponderStop, ponderHit = \
+            self._ponderRequest, self._ponderStop, self._ponderHit
+        self._ponderRequest = self._ponderStop = self._ponderHit = None
+        self._cancelRequest()
+
+        if ponderRequest is not None and board.zobristKey == self._ponderKey:
+            self.ponderHits += 1
+            ponderHit.set()
+            self._stopEvent = ponderStop
+            self._request = Future()
+            ponderRequest.add_done_callback(partial(
+                self._finishPonder, self._request, board.copy(), list(possMoves), ponderStop,
+                time.perf_counter()))
+            return self._request
+
+        if ponderRequest is not None:
+            # the work is simply dropped; what it stored in the table may still help
+            self.ponderMisses += 1
+            ponderStop.set()
+
+        self._stopEvent = threading.Event()
+        self._request = self._worker().submit(self._searchMove, board.copy(), list(possMoves),
+                                              self._stopEvent)
+        return self._request
+
+    def ponder(self, board: Position):
+        """Searches the position after the reply the last search expected"""
+
+        self._stopPonder()
+        if not self.ponderEnabled or self.lastResult is None or len(self.lastResult.pv) < 2:
+            return
+        expected = self.lastResult.pv[1]
+        if not board.isLegalMoveCode(expected):
+            return
+
+        position = board.copy()
+        position.makeMoveCode(expected)
+        self._ponderKey = position.zobristKey
+        self._ponderStop = threading.Event()
+        self._ponderHit = threading.Event()
+        self._ponderRequest = self._worker().submit(
+            self.searcher.search, position, limits=self.limits, stopEvent=self._ponderStop,
+            ponderHit=self._ponderHit)
+
+    def cancelMove(self):
+        self._cancelRequest()
+        self._stopPonder()
+
+    def close(self):
+        super().close()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def _worker(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1,
+                                                thread_name_prefix=f'search-{self.nickname}')
+        return self._executor
+
+    def _cancelRequest(self):
+        if self._request is not None:
+            self._stopEvent.set()
+            self._request.cancel()
+            self._request = None
+            self._stopEvent = None
+
+    def _stopPonder(self):
+        if self._ponderRequest is not None:
+            self._ponderStop.set()
+            self._ponderRequest.cancel()
+            self._ponderRequest = self._ponderStop = self._ponderHit = None
+
+    def _finishPonder(self, request: Future, board: Position, possMoves: list[Move],
+                      stopEvent: threading.Event, hitTime: float, ponderRequest: Future):
+        # runs once the ponder search that became this move's search ends
+        if not request.set_running_or_notify_cancel():
+            return
+        if stopEvent.is_set() or ponderRequest.cancelled():
+            request.set_result(None)
+            return
+        try:
+            result = ponderRequest.result()
+        except Exception as exception:
+            request.set_exception(exception)
+            return
+        request.set_result(self._chooseMove(board, possMoves, result,
+                                            time.perf_counter() - hitTime))
+
+    def _searchMove(self, board: Position, possMoves: list[Move],
+                    stopEvent: (threading.Event | None)) -> (Move | None):
+        if not possMoves:
+            return None
+
+        result = self.searcher.search(board, limits=self.limits, stopEvent=stopEvent)
+        if stopEvent is not None and stopEvent.is_set():
+            # cancelled: nobody is waiting for the move
+            return None
+        return self._chooseMove(board, possMoves, result, result.seconds)
+
+    def _chooseMove(self, board: Position, possMoves: list[Move], result: SearchResult,
+                    seconds: float) -> (Move | None):
+        self.lastResult = result
+        if self.limits is not None and self.limits.clock is not None:
+            # sudden death: the clock runs down by the time used, plus the increment
+            self.limits = self.limits._replace(
+                clock=self.limits.clock - seconds + self.limits.increment)
+        if self.lastResult.bestMove == NULL_MOVE:
+            return None
+
+        # hand back the caller's own move object where there is one
+        for move in possMoves:
+            if encodeMove(move) == self.lastResult.bestMove:
+                return move
+        return board.decodeMove(self.lastResult.bestMove)
+
+    def __str__(self):
+        return super().__str__() + " is searching computer."
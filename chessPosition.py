@@ -1,4 +1,5 @@
-from typing import Iterator
+from array import array
+from typing import Callable, Iterator, NamedTuple
 
 from typedefs import (
     PieceChar,
@@ -8,31 +9,96 @@ from typedefs import (
     Coord
 )
 import fen as FEN
+import bitboard
+from bitboard import FULL
+import attackTables as tables
+import magics
+import zobrist
 from fen import STANDARD_START_POSITION
+import chessMove
 from chessMove import (
     Move,
-    Capture,
-    EnPassant,
-    PawnPush,
-    PawnDoublePush,
-    PawnPromotion,
-    PromotionByPush,
-    PromotionByCapture,
-    Castle
+    packMove,
+    encodeMove,
+    decodeMove,
+    isCapture,
+    QUIET,
+    DOUBLE_PUSH,
+    KING_CASTLE,
+    QUEEN_CASTLE,
+    CAPTURE,
+    EP_CAPTURE,
+    PROMOTION,
+    PROMOTION_CAPTURE,
+    PROMOTION_PIECES,
+    NULL_MOVE
 )
-import chessPiece
 from chessPiece import (
     Piece,
-    King,
-    Queen,
-    Bishop,
-    Knight,
-    Rook,
-    Pawn
+    PIECES,
+    PIECE_CLASSES,
+    PIECE_VALUES,
+    EMPTY,
+    PAWN,
+    KNIGHT,
+    BISHOP,
+    ROOK,
+    QUEEN,
+    KING,
+    TYPE_MASK,
+    BLACK_BIT,
+    NUM_CODES,
+    COLOR_BITS,
+    COLOR_INDEX,
+    codeColor
 )
 
-BoardArray = list[list[(Piece | None)]]
 BoardEnumerator = Iterator[tuple[int, int, (Piece | None)]]
+MoveBuffer = array    # array('H') of packed moves, see chessMove
+
+# promotions are listed queen first, as the old generator did
+_PROMOTION_ORDER = tuple(reversed(range(len(PROMOTION_PIECES))))
+_PROMOTION_TYPES = tuple(PIECE_CLASSES[pieceChar].typeCode for pieceChar in PROMOTION_PIECES)
+
+# piece code -> value in a static exchange; the king is worth more than any trade
+_EXCHANGE_VALUES = [100 if code & TYPE_MASK == KING else value
+                    for code, value in enumerate(PIECE_VALUES)]
+
+# which moves the generators add (bit flags)
+GEN_CAPTURES = 1    # captures (en passant included) and all promotions
+GEN_QUIETS = 2      # everything else, castling included
+GEN_ALL = GEN_CAPTURES | GEN_QUIETS
+
+# the stages of Position.iterMoves, in the order they are yielded
+STAGE_HASH = 0
+STAGE_CAPTURES = 1
+STAGE_QUIETS = 2
+
+
+class MoveUndo(NamedTuple):
+    """Everything needed to revert a move made with Position.makeMove"""
+
+    move: int               # packed, see chessMove
+    movedPiece: int         # piece code, see chessPiece
+    captured: int           # piece code (EMPTY if nothing was captured)
+    capturedAt: int         # square number
+    castleRights: dict[ColorChar, dict[PieceChar, bool]]
+    epTarget: (Coord | None)
+    halfMoveClock: int
+    fullMoveNumber: int
+    fenStr: (str | None)    # the cached FEN, if it had been built
+    zobristKey: int
+    maxRepetition: int
+
+
+class LegalityMasks(NamedTuple):
+    """What decides, for one side, which pseudo-legal moves are legal"""
+
+    kingSquare: int
+    checkers: int           # bitboard of the pieces giving check
+    checkMask: int          # squares a non-king move must land on to answer the check
+    pins: dict[int, int]    # pinned piece's square -> the ray it may still move along
+    kingDanger: int         # squares attacked by the opponent, looking through our king
 
 
 class Position:
@@ -43,13 +109,21 @@ class Position:
     epTarget: (Coord | None)
     halfMoveClock: int
     fullMoveNumber: int
-    fenStr: str
-    positionHistory: dict[str, int]   # dictionary of FEN without move counts
-
-    _board: BoardArray
+    positionHistory: dict[int, int]   # number of times each zobristKey has occurred
+
+    _squares: list[int]     # piece code per square number (EMPTY if none)
+    _pieceBB: list[int]     # bitboard per piece code
+    _colorBB: list[int]     # occupancy per color index (code >> 3)
+    _kingSquares: list[(int | None)]    # per color index
+    _material: list[int]    # per color index, kings excluded
+    _maxRepetition: int     # the highest count in positionHistory
+    _occupied: int
+    _zobristKey: int
+    _undoStack: list[MoveUndo]
+    _plyBuffers: list[MoveBuffer]
+    _fenStr: (str | None)   # cached, None until fenStr is next read
 
     def __init__(self, startPos: str = STANDARD_START_POSITION):
-        self.fenStr = startPos
         self.setState(startPos)
 
     def setState(self, fen: str):
@@ -58,34 +132,43 @@ class Position:
         Args:
             fen (str): a FEN string describing the game state
         """
-        temp = fen.split(' ')
-        self.setPosition(temp[0])
-        self.toMove = ColorChar(temp[1])
-
-        self.castleRights = {
-            ColorChar.WHITE: {PieceChar.KING: False, PieceChar.QUEEN: False},
-            ColorChar.BLACK: {PieceChar.KING: False, PieceChar.QUEEN: False}
-        }
-        for char in temp[2]:
-            if char == 'K':
-                self.castleRights[ColorChar.WHITE][PieceChar.KING] = True
-            elif char == 'Q':
-                self.castleRights[ColorChar.WHITE][PieceChar.QUEEN] = True
-            elif char == 'k':
-                self.castleRights[ColorChar.BLACK][PieceChar.KING] = True
-            elif char == 'q':
-                self.castleRights[ColorChar.BLACK][PieceChar.QUEEN] = True
-
-        self.epTarget = FEN.squareToCoord(temp[3]) if temp[3] != '-' else None
-        self.halfMoveClock = int(temp[4])
-        self.fullMoveNumber = int(temp[5])
-
-        # initial FEN
-        self._updateFEN()
-
-        # set for determining three fold repetition
-        self.positionHistory = {}
-        self.positionHistory.setdefault(self._getPositionHistoryStr(), 1)
+        fields = FEN.parseFEN(fen)
+        self._zobristKey = 0
+        self._setSquares(fields.squares)
+        self.toMove = fields.toMove
+        self.castleRights = fields.castleRights
+        self.epTarget = fields.epTarget
+        self.halfMoveClock = fields.halfMoveClock
+        self.fullMoveNumber = fields.fullMoveNumber
+        self._startHistory()
+
+    def copy(self) -> 'Position':
+        """Returns an independent copy, move history included, e.g. for a search
+        running in another thread
+        """
+        other = Position.__new__(Position)
+        other.toMove = self.toMove
+        other.castleRights = {color: dict(rights) for color, rights in self.castleRights.items()}
+        other.epTarget = self.epTarget
+        other.halfMoveClock = self.halfMoveClock
+        other.fullMoveNumber = self.fullMoveNumber
+        other.positionHistory = dict(self.positionHistory)
+
+        other._squares = list(self._squares)
+        other._pieceBB = list(self._pieceBB)
+        other._colorBB = list(self._colorBB)
+        other._kingSquares = list(self._kingSquares)
+        other._material = list(self._material)
+        other._maxRepetition = self._maxRepetition
+        other._occupied = self._occupied
+        other._zobristKey = self._zobristKey
+        # unmakeMove hands the saved rights back to the position, so each copy needs its own
+        other._undoStack = [undo._replace(castleRights={color: dict(rights) for color, rights
+                                                        in undo.castleRights.items()})
+                            for undo in self._undoStack]
+        other._plyBuffers = []
+        other._fenStr = self._fenStr
+        return other
 
     def setPosition(self, position: str):
         """Sets the position of pieces on the board
@@ -93,53 +176,95 @@ class Position:
         Args:
             position (str): the board position in Forsyth-Edwards Notation
         """
-        temp = position.split("/")
-
-        self._board = []
-        for i, row in enumerate(temp):
-            self._board.append([])
-
-            for char in row:
-                if char in '12345678':
-                    self._board[i] += [None] * int(char)
-                else:
-                    pieceChar = PieceChar(char.lower())
-                    colorChar = ColorChar.BLACK if char.islower() else ColorChar.WHITE
-                    piece = self._createPiece(pieceChar, colorChar)
+        squares = FEN.placementFromFEN(position)
+        self._zobristKey = 0
+        self._setSquares(squares)
+        self._startHistory()
+
+    def _startHistory(self):
+        """Finishes the zobristKey of freshly placed pieces and starts the move
+        history over from the current state
+        """
+        self._fenStr = None
 
-                    self._board[i].append(piece)
+        # the pieces were hashed as they were placed
+        self._zobristKey ^= zobrist.castleKey(self.castleRights) ^ zobrist.epKey(self.epTarget)
+        if self.toMove == ColorChar.BLACK:
+            self._zobristKey ^= zobrist.BLACK_TO_MOVE
 
-    def _createPiece(self, pieceChar: PieceChar, colorChar: ColorChar) -> Piece:
-        if pieceChar == PieceChar.KING:
-            return King(colorChar)
+        # set for determining three fold repetition
+        self.positionHistory = {self._zobristKey: 1}
+        self._maxRepetition = 1
+
+        self._undoStack = []
+        self._plyBuffers = []
+
+    def _setSquares(self, squares: list[int]):
+        self._squares = [EMPTY] * bitboard.NUM_SQUARES
+        self._pieceBB = [0] * NUM_CODES
+        self._colorBB = [0, 0]
+        self._occupied = 0
+        self._kingSquares = [None, None]
+        self._material = [0, 0]
+
+        for square, code in enumerate(squares):
+            if code:
+                self._setPiece(square, code)
+
+    def _setPiece(self, square: int, code: int):
+        """Puts the piece code (or EMPTY) on the square, keeping the bitboards in sync"""
+
+        mask = 1 << square
+        old = self._squares[square]
+        if old:
+            self._pieceBB[old] ^= mask
+            self._colorBB[old >> 3] ^= mask
+            self._material[old >> 3] -= PIECE_VALUES[old]
+            self._zobristKey ^= zobrist.CODE_KEYS[old][square]
+        if code:
+            self._pieceBB[code] |= mask
+            self._colorBB[code >> 3] |= mask
+            self._material[code >> 3] += PIECE_VALUES[code]
+            self._zobristKey ^= zobrist.CODE_KEYS[code][square]
+            if code & TYPE_MASK == KING:
+                self._kingSquares[code >> 3] = square
+
+        self._squares[square] = code
+        self._occupied = self._colorBB[0] | self._colorBB[1]
 
-        if pieceChar == PieceChar.QUEEN:
-            return Queen(colorChar)
+    @property
+    def fenStr(self) -> str:
+        """The position as a FEN string, built on first use after each change"""
 
-        if pieceChar == PieceChar.BISHOP:
-            return Bishop(colorChar)
+        if self._fenStr is None:
+            self._fenStr = FEN.formatFEN(self._squares, self.toMove, self.castleRights,
+                                         self.epTarget, self.halfMoveClock, self.fullMoveNumber)
+        return self._fenStr
 
-        if pieceChar == PieceChar.KNIGHT:
-            return Knight(colorChar)
+    @property
+    def zobristKey(self) -> int:
+        """64-bit hash of the piece placement, side to move, castle rights and en
+        passant file. Kept up to date incrementally by makeMove and unmakeMove.
+        """
+        return self._zobristKey
 
-        if pieceChar == PieceChar.ROOK:
-            return Rook(colorChar)
+    @property
+    def movesMade(self) -> int:
+        """The number of moves that unmakeMove can take back"""
 
-        return Pawn(colorChar)
+        return len(self._undoStack)
 
     @property
     def numRows(self) -> int:
         """The number of rows the board has"""
 
-        return len(self._board)
+        return bitboard.NUM_ROWS
 
     @property
     def numCols(self) -> int:
         """The number of columns the board has"""
 
-        if self.numRows == 0:
-            return 0
-        return len(self._board[0])
+        return bitboard.NUM_COLS
 
     def _pawnHomeRow(self, color: ColorChar) -> int:
         return (self.numRows - 2) if color == ColorChar.WHITE else 1
@@ -155,9 +280,16 @@ class Position:
     def enumerateBoard(self) -> BoardEnumerator:
         """Generator of (row, col, piece) tuples"""
 
-        for i, row in enumerate(self._board):
-            for j, piece in enumerate(row):
-                yield (i, j, piece)
+        for square, code in enumerate(self._squares):
+            row, col = divmod(square, bitboard.NUM_COLS)
+            yield (row, col, PIECES[code])
+
+    def enumeratePieces(self, color: ColorChar) -> BoardEnumerator:
+        """Generator of (row, col, piece) tuples for the pieces of the given color only"""
+
+        for square in bitboard.iterSquares(self._colorBB[COLOR_INDEX[color]]):
+            row, col = divmod(square, bitboard.NUM_COLS)
+            yield (row, col, PIECES[self._squares[square]])
 
     def getPieceAt(self, row: int, col: int) -> (Piece | None):
         """Returns the piece at the given board position
@@ -169,7 +301,12 @@ class Position:
         Returns:
             (Piece | None): the piece at the given position (None if empty)
         """
-        return self._board[row][col]
+        return PIECES[self._squares[bitboard.squareIndex(row, col)]]
+
+    def pieceCodeAt(self, square: int) -> int:
+        """Returns the piece code (see chessPiece) on the given square number"""
+
+        return self._squares[square]
 
     def _coordOutOfBounds(self, row: int, col: int) -> bool:
         return row < 0 or row >= self.numRows or col < 0 or col >= self.numCols
@@ -177,233 +314,555 @@ class Position:
     def getLegalMoves(self, color: ColorChar) -> list[Move]:
         """Returns a list of all legal moves for the player of the given color"""
 
-        moves = []
-
-        for row, col, piece in self.enumerateBoard():
-            if piece is not None and piece.color == color:
-                moves += self.getPieceLegalMoves(row, col)
-
-        return moves
+        return [self.decodeMove(code) for code in self.getLegalMoveCodes(color)]
 
     def getPieceLegalMoves(self, row: int, col: int) -> list[Move]:
         """Returns a list of legal moves on the board for the piece at (row, col)"""
 
-        piece = self._board[row][col]
-        if piece is None:
-            square = FEN.coordToSquare((row, col))
-            raise Exception(f"No piece exists at {square}!")
+        square = bitboard.squareIndex(row, col)
+        code = self._squares[square]
+        if not code:
+            raise Exception(f"No piece exists at {FEN.coordToSquare((row, col))}!")
 
-        moves = self._getPiecePseudoLegalMoves(row, col, piece)
-        moves += self._getPiecePseudoLegalCaptures(row, col, piece)
+        color = codeColor(code)
+        buffer = array('H')
+        self._addPieceLegalMoves(square, code, color, self._legalityMasks(color), buffer)
+        return [self.decodeMove(code) for code in buffer]
 
-        # check which moves are legal
-        return [move for move in moves if not self.moveIntoCheck(move)]
+    def getLegalMoveCodes(self, color: ColorChar,
+                          buffer: (MoveBuffer | None) = None) -> MoveBuffer:
+        """Fills buffer (emptied first, or a new array('H')) with every legal move
+        of the given color in packed form, and returns it
+        """
+        if buffer is None:
+            buffer = array('H')
+        else:
+            del buffer[:]
 
-    def _getPiecePseudoLegalMoves(self, row: int, col: int, piece: Piece) -> list[Move]:
-        moves: list[Move] = []
-        start = (row, col)
+        self._addLegalMoves(color, self._legalityMasks(color), buffer, GEN_ALL)
+        return buffer
 
-        if piece.moveRange == chessPiece.MAX_RANGE:
-            moveRange = self.numRows
-        else:
-            moveRange = piece.moveRange
+    def iterMoves(self, hashMove: int = NULL_MOVE, stage: int = STAGE_QUIETS,
+                  sortKey: (Callable[[int], int] | None) = None) -> Iterator[int]:
+        """Generator of the packed legal moves of the side to move, in stages: the
+        hash move (only if it is legal here), then captures and promotions, then
+        quiet moves. stage is the last stage to generate, e.g. STAGE_CAPTURES for a
+        quiescence search. With a sortKey, each stage is yielded highest key first.
+
+        A stage is only generated once the one before it is used up, so a search
+        that cuts off early never pays for the quiet moves. The caller must have
+        unmade whatever it played before asking for the next move.
+        """
+        color = self.toMove
+        masks = self._legalityMasks(color)
 
-        if isinstance(piece, Pawn) and row == self._pawnHomeRow(self.toMove):
-            moveRange += 1
+        if hashMove != NULL_MOVE and self._isLegalMoveCode(hashMove, color, masks):
+            yield hashMove
 
-        for moveDir in piece.moveDirection:
-            for i in range(1, moveRange + 1):
-                newr = row + moveDir[0] * i
-                newc = col + moveDir[1] * i
+        for kinds, stageNumber in ((GEN_CAPTURES, STAGE_CAPTURES), (GEN_QUIETS, STAGE_QUIETS)):
+            if stage < stageNumber:
+                return
 
-                if self._coordOutOfBounds(newr, newc):
-                    break
+            buffer = array('H')
+            self._addLegalMoves(color, masks, buffer, kinds)
+            for code in (buffer if sortKey is None else sorted(buffer, key=sortKey, reverse=True)):
+                if code != hashMove:
+                    yield code
 
-                target = self._board[newr][newc]
-                # Stop after encountering another piece
-                if target is not None:
-                    break
+    def hasLegalMove(self) -> bool:
+        """Returns whether the side to move has any legal move, stopping at the first.
 
-                end = (newr, newc)
-                # move = Move(start,end)
-                if isinstance(piece, Pawn) and i == 2:
-                    move = PawnDoublePush(start, end)
-                elif isinstance(piece, Pawn) and end[0] == self._pawnPromoteRow(piece.color):
-                    for pieceChar in ( PieceChar.QUEEN, PieceChar.KNIGHT, PieceChar.ROOK, PieceChar.BISHOP): 
-                        moves.append(PromotionByPush(start, end, pieceChar) )
-                    continue
+        King steps are tried first (a plain bitboard test), then capturing a lone
+        checker, then the remaining pieces one at a time.
+        """
+        color = self.toMove
+        masks = self._legalityMasks(color)
+        ours = self._colorBB[COLOR_INDEX[color]]
+
+        if tables.KING_ATTACKS[masks.kingSquare] & ~ours & ~masks.kingDanger:
+            return True
+
+        # double check: only the king could have moved
+        if masks.checkers and not masks.checkMask:
+            return False
+
+        if masks.checkers:
+            checker = masks.checkers
+            attackers = self._attackersTo(bitboard.lowestSquare(checker), color, self._occupied) \
+                & ~(1 << masks.kingSquare)
+            for square in bitboard.iterSquares(attackers):
+                if masks.pins.get(square, FULL) & checker:
+                    return True
 
-                else:
-                    move = Move(start, end)
-                moves.append(move)
+        buffer = array('H')
+        squares = self._squares
+        for square in bitboard.iterSquares(ours & ~(1 << masks.kingSquare)):
+            self._addPieceLegalMoves(square, squares[square], color, masks, buffer)
+            if buffer:
+                return True
 
-        if isinstance(piece, King):
-            moves += self._getPiecePseudoLegalCastle(row, col, piece)
+        # castling is never the only legal move: the king can always step sideways instead
+        return False
 
-        return moves
+    def isLegalMoveCode(self, code: int) -> bool:
+        """Returns whether the packed move is legal for the side to move (e.g. a move
+        from the transposition table, which may belong to another position)
+        """
+        return self._isLegalMoveCode(code, self.toMove, self._legalityMasks(self.toMove))
+
+    def _isLegalMoveCode(self, code: int, color: ColorChar, masks: LegalityMasks) -> bool:
+        start = code & 0x3F
+        piece = self._squares[start]
+        if not piece or codeColor(piece) != color:
+            return False
+
+        buffer = array('H')
+        self._addPieceLegalMoves(start, piece, color, masks, buffer)
+        return code in buffer
+
+    def _addLegalMoves(self, color: ColorChar, masks: LegalityMasks, buffer: MoveBuffer,
+                       kinds: int):
+        squares = self._squares
+        for square in bitboard.iterSquares(self._colorBB[COLOR_INDEX[color]]):
+            self._addPieceLegalMoves(square, squares[square], color, masks, buffer, kinds)
+
+    def decodeMove(self, code: int) -> Move:
+        """Converts a packed move into the matching move object (before it is made)"""
+
+        piece = self._squares[chessMove.moveStart(code)]
+        return decodeMove(code, piece & TYPE_MASK == PAWN)
+
+    def _legalityMasks(self, color: ColorChar) -> LegalityMasks:
+        """Finds the checkers and pinned pieces of the given side, once per position"""
+        pieceBB = self._pieceBB
+        them = COLOR_BITS[color.opponent]
+        kingSquare = self._kingSquares[COLOR_INDEX[color]]
+        kingBB = 1 << kingSquare
+
+        checkers = (tables.PAWN_ATTACKS[color][kingSquare] & pieceBB[PAWN | them]) \
+            | (tables.KNIGHT_ATTACKS[kingSquare] & pieceBB[KNIGHT | them])
+        checkMask = checkers
+        pins = {}
+
+        # sliders lined up with the king either give check or pin whatever single
+        # piece of ours stands in between
+        snipers = (tables.ROOK_RAYS[kingSquare]
+                   & (pieceBB[ROOK | them] | pieceBB[QUEEN | them])) \
+            | (tables.BISHOP_RAYS[kingSquare]
+               & (pieceBB[BISHOP | them] | pieceBB[QUEEN | them]))
+        for sniper in bitboard.iterSquares(snipers):
+            between = tables.BETWEEN[kingSquare][sniper]
+            blockers = between & self._occupied
+            if not blockers:
+                checkers |= bitboard.bit(sniper)
+                checkMask |= between | bitboard.bit(sniper)
+            elif blockers & (blockers - 1) == 0 and blockers & self._colorBB[COLOR_INDEX[color]]:
+                pins[bitboard.lowestSquare(blockers)] = between | bitboard.bit(sniper)
+
+        if not checkers:
+            checkMask = FULL
+        elif bitboard.popCount(checkers) > 1:
+            # double check: only the king can move
+            checkMask = 0
+
+        kingDanger = self._attackMap(color.opponent, self._occupied ^ kingBB)
+
+        return LegalityMasks(kingSquare, checkers, checkMask, pins, kingDanger)
+
+    def _addPieceLegalMoves(self, square: int, code: int, color: ColorChar,
+                            masks: LegalityMasks, buffer: MoveBuffer, kinds: int = GEN_ALL):
+        pieceType = code & TYPE_MASK
+        if pieceType == KING:
+            allowed = FULL ^ masks.kingDanger
+        else:
+            allowed = masks.checkMask & masks.pins.get(square, FULL)
+
+        if pieceType == PAWN:
+            self._addPawnMoves(square, color, allowed, buffer, kinds)
+            if kinds & GEN_CAPTURES:
+                self._addPieceLegalEnPassant(square, color, masks, buffer)
+            return
+
+        attacks = self._pieceAttacks(square, code, self._occupied) & allowed
+        if kinds & GEN_QUIETS:
+            for target in bitboard.iterSquares(attacks & ~self._occupied):
+                buffer.append(square | (target << 6))
+        if kinds & GEN_CAPTURES:
+            for target in bitboard.iterSquares(attacks & self._colorBB[(code >> 3) ^ 1]):
+                buffer.append(packMove(square, target, CAPTURE))
+
+        if pieceType == KING and not masks.checkers and kinds & GEN_QUIETS:
+            self._addPieceLegalCastles(square, color, masks.kingDanger, buffer)
+
+    def _addPawnMoves(self, square: int, color: ColorChar, allowed: int,
+                      buffer: MoveBuffer, kinds: int):
+        empty = FULL ^ self._occupied
+        promoteRow = self._pawnPromoteRow(color)
+
+        single = tables.PAWN_PUSHES[color][square] & empty
+        for target in bitboard.iterSquares(single & allowed):
+            if target // bitboard.NUM_COLS == promoteRow:
+                if kinds & GEN_CAPTURES:
+                    for index in _PROMOTION_ORDER:
+                        buffer.append(packMove(square, target, PROMOTION + index))
+            elif kinds & GEN_QUIETS:
+                buffer.append(packMove(square, target, QUIET))
+
+        if single and kinds & GEN_QUIETS \
+                and square // bitboard.NUM_COLS == self._pawnHomeRow(color):
+            double = bitboard.pawnPushes(single, color) & empty & allowed
+            for target in bitboard.iterSquares(double):
+                buffer.append(packMove(square, target, DOUBLE_PUSH))
+
+        if not kinds & GEN_CAPTURES:
+            return
+
+        targets = tables.PAWN_ATTACKS[color][square] \
+            & self._colorBB[COLOR_INDEX[color.opponent]] & allowed
+        for target in bitboard.iterSquares(targets):
+            if target // bitboard.NUM_COLS == promoteRow:
+                for index in _PROMOTION_ORDER:
+                    buffer.append(packMove(square, target, PROMOTION_CAPTURE + index))
+            else:
+                buffer.append(packMove(square, target, CAPTURE))
 
-    def _getPiecePseudoLegalCastle(self, row: int, col: int, piece: King) -> list[Move]:
-        """Since castling is such a unique move, it will be handled separately here."""
+    def _addPieceLegalCastles(self, square: int, color: ColorChar, attacked: int,
+                              buffer: MoveBuffer):
+        """Since castling is such a unique move, it will be handled separately here.
 
-        moves: list[Move] = []
-        start = (row, col)
+        Only called when the king is not in check; attacked is the opponent's attack map.
+        """
         # Check both kingside and queenside
-        for side in [PieceChar.KING, PieceChar.QUEEN]:
-            if not self.castleRights[self.toMove][side]:
+        for side, flag, moveDir in ((PieceChar.KING, KING_CASTLE, 1),
+                                    (PieceChar.QUEEN, QUEEN_CASTLE, -1)):
+            if not self.castleRights[color][side]:
                 continue
 
-            _, rookCol = self._rookHomeSquare(self.toMove, side)
+            rookSquare = bitboard.squareIndex(*self._rookHomeSquare(color, side))
 
             # check if squares between the king and rook are empty
-            startCol = min(col, rookCol) + 1
-            endCol = max(col, rookCol)
-            if any(piece is not None for piece in self._board[row][startCol:endCol]):
+            if tables.BETWEEN[square][rookSquare] & self._occupied:
                 continue
 
-            moveDir = 1 if side == PieceChar.KING else -1
-
             # check that the king isn't walking through or into check
-            coords = [(row, col + moveDir * (i + 1)) for i in range(2)]
-            if any(self.isSquareAttacked(coord, self.toMove.opponent) for coord in coords):
+            path = bitboard.bit(square + moveDir) | bitboard.bit(square + 2 * moveDir)
+            if attacked & path:
                 continue
 
-            newc = col + moveDir * 2
-            end = (row, newc)
-            moves.append(Castle(start, end))
-
-        return moves
+            buffer.append(packMove(square, square + 2 * moveDir, flag))
 
-    def _getPiecePseudoLegalCaptures(self, row: int, col: int, piece: Piece) -> list[Move]:
-        captures: list[Move] = []
-        start = (row, col)
+    def _addPieceLegalEnPassant(self, square: int, color: ColorChar,
+                                masks: LegalityMasks, buffer: MoveBuffer):
+        """En passant removes two pieces from one row, so it gets an exact test of its own"""
 
-        attacks = self._getPieceAttacks(row, col, piece)
+        if self.epTarget is None or color != self.toMove:
+            return
 
-        for newr, newc in attacks:
-            target = self._board[newr][newc]
-            end = (newr, newc)
+        target = bitboard.squareIndex(*self.epTarget)
+        if not tables.PAWN_ATTACKS[color][square] & bitboard.bit(target):
+            return
 
-            if target is not None:
-                if isinstance(piece, Pawn) and end[0] == self._pawnPromoteRow(piece.color):
-                    # captures.append(PromotionByCapture(start, end))
-                    for pieceChar in ( PieceChar.QUEEN, PieceChar.KNIGHT, PieceChar.ROOK, PieceChar.BISHOP): 
-                        captures.append(PromotionByCapture(start, end, pieceChar) )
-                    continue
+        # must capture the checking pawn or block the check
+        captured = bitboard.squareIndex(square // bitboard.NUM_COLS, self.epTarget[1])
+        if not masks.checkMask & (bitboard.bit(target) | bitboard.bit(captured)):
+            return
 
-                else:
-                    captures.append(Capture(start, end))
+        # with both pawns gone, a slider may now see the king (pins included)
+        occupied = (self._occupied ^ bitboard.bit(square) ^ bitboard.bit(captured)) \
+            | bitboard.bit(target)
+        them = COLOR_BITS[color.opponent]
+        queens = self._pieceBB[QUEEN | them]
+        if magics.rookAttacks(masks.kingSquare, occupied) & (self._pieceBB[ROOK | them] | queens):
+            return
+        if magics.bishopAttacks(masks.kingSquare, occupied) \
+                & (self._pieceBB[BISHOP | them] | queens):
+            return
 
-            # Check for en passant availability
-            if isinstance(piece, Pawn) and end == self.epTarget:
-                captures.append(EnPassant(start, end))
+        buffer.append(packMove(square, target, EP_CAPTURE))
 
-        return captures
-
-    def _getPieceAttacks(self, row: int, col: int, piece: Piece) -> list[Coord]:
-        attacks = []
-
-        if piece.attackRange == chessPiece.MAX_RANGE:
-            attackRange = self.numRows
-        else:
-            attackRange = piece.attackRange
-
-        for attackDir in piece.attackDirection:
-            for i in range(1, attackRange + 1):
-                newr = row + attackDir[0] * i
-                newc = col + attackDir[1] * i
+    def _pieceAttacks(self, square: int, code: int, occupied: int) -> int:
+        """Returns the bitboard of squares the piece (code) on the given square
+        attacks, including squares held by its own side
+        """
+        pieceType = code & TYPE_MASK
+        if pieceType == PAWN:
+            return tables.PAWN_ATTACKS[codeColor(code)][square]
+        if pieceType == KNIGHT:
+            return tables.KNIGHT_ATTACKS[square]
+        if pieceType == KING:
+            return tables.KING_ATTACKS[square]
+        if pieceType == BISHOP:
+            return magics.bishopAttacks(square, occupied)
+        if pieceType == ROOK:
+            return magics.rookAttacks(square, occupied)
+        return magics.queenAttacks(square, occupied)
+
+    def attackMap(self, color: ColorChar) -> int:
+        """Returns the bitboard of every square attacked by a piece of the given color
+
+        Pawns, knights and kings are handled set-wise, so this costs the same for one
+        knight as it does for ten; sliders use one magic lookup each.
+        """
+        return self._attackMap(color, self._occupied)
 
-                if self._coordOutOfBounds(newr, newc):
-                    break
+    def _attackMap(self, color: ColorChar, occupied: int) -> int:
+        pieceBB = self._pieceBB
+        us = COLOR_BITS[color]
 
-                attacks.append((newr, newc))
+        attacks = bitboard.pawnAttacks(pieceBB[PAWN | us], color) \
+            | bitboard.knightAttacks(pieceBB[KNIGHT | us]) \
+            | bitboard.kingAttacks(pieceBB[KING | us])
 
-                # Stop after encountering another piece
-                target = self._board[newr][newc]
-                if target is not None:
-                    # Ignore attacks on pieces of the same color
-                    if target.color == piece.color:
-                        attacks.pop()
-                    break
+        # a magic lookup per slider beats filling all of them set-wise
+        for square in bitboard.iterSquares(pieceBB[BISHOP | us] | pieceBB[QUEEN | us]):
+            attacks |= magics.bishopAttacks(square, occupied)
+        for square in bitboard.iterSquares(pieceBB[ROOK | us] | pieceBB[QUEEN | us]):
+            attacks |= magics.rookAttacks(square, occupied)
 
         return attacks
 
     def isSquareAttacked(self, square: Coord, color: ColorChar) -> bool:
         """Returns whether the given square is attacked by a piece of the given color"""
 
-        attacks: list[Coord] = []
-        for row, col, piece in self.enumerateBoard():
-            if piece is not None and piece.color == color:
-                attacks += self._getPieceAttacks(row, col, piece)
+        return self._isAttacked(bitboard.squareIndex(*square), color, self._occupied)
 
-        return square in attacks
+    def attackersOf(self, square: Coord, color: ColorChar) -> list[Coord]:
+        """Returns the coordinates of every piece of the given color attacking the square"""
+
+        attackers = self._attackersTo(bitboard.squareIndex(*square), color, self._occupied)
+        return [bitboard.squareCoord(attacker) for attacker in bitboard.iterSquares(attackers)]
+
+    def captureGain(self, code: int) -> int:
+        """Material the packed move wins on the spot: the piece captured, plus what a
+        promotion adds (in PIECE_VALUES units)
+        """
+        flag = code >> 12
+        if flag == EP_CAPTURE:
+            gain = PIECE_VALUES[PAWN]
+        else:
+            gain = PIECE_VALUES[self._squares[(code >> 6) & 0x3F]]
+        if flag >= PROMOTION:
+            gain += PIECE_VALUES[_PROMOTION_TYPES[flag & 3]] - PIECE_VALUES[PAWN]
+        return gain
+
+    def staticExchange(self, code: int) -> int:
+        """Static exchange evaluation (SEE) of the packed move: the material the side
+        to move ends up winning (in PIECE_VALUES units) if both sides then keep
+        recapturing on the end square, least valuable attacker first, for as long
+        as it pays. Pins are not considered; x-ray attackers behind a capturer are.
+        """
+        start = code & 0x3F
+        end = (code >> 6) & 0x3F
+        flag = code >> 12
+        pieceBB = self._pieceBB
+
+        occupied = self._occupied & ~(1 << start)
+        if flag == EP_CAPTURE:
+            occupied &= ~(1 << ((start & ~7) | (end & 7)))
+        onSquare = _EXCHANGE_VALUES[self._squares[start]]
+        if flag >= PROMOTION:
+            onSquare = PIECE_VALUES[_PROMOTION_TYPES[flag & 3]]
+
+        # gains[i]: what the side making the i-th capture wins if the exchange stops there
+        gains = [self.captureGain(code)]
+        color = self.toMove.opponent
+        while True:
+            attackers = self._attackersTo(end, color, occupied) & occupied
+            if not attackers:
+                break
+            bits = COLOR_BITS[color]
+            for pieceType in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+                candidates = attackers & pieceBB[pieceType | bits]
+                if candidates:
+                    break
+            gains.append(onSquare - gains[-1])
+            occupied &= ~(candidates & -candidates)
+            onSquare = _EXCHANGE_VALUES[pieceType | bits]
+            color = color.opponent
+
+        # each side only recaptures when that beats stopping
+        for index in range(len(gains) - 1, 0, -1):
+            gains[index - 1] = -max(-gains[index - 1], gains[index])
+        return gains[0]
+
+    def _attackersTo(self, square: int, color: ColorChar, occupied: int) -> int:
+        """Bitboard of the pieces of the given color attacking the square.
+
+        Works backwards from the target: a knight attacks the square exactly when a
+        knight standing on the square would attack it, and likewise for the other
+        pieces (pawns looking the opposite way).
+        """
+        pieceBB = self._pieceBB
+        us = COLOR_BITS[color]
+
+        return (tables.PAWN_ATTACKS[color.opponent][square] & pieceBB[PAWN | us]) \
+            | (tables.KNIGHT_ATTACKS[square] & pieceBB[KNIGHT | us]) \
+            | (tables.KING_ATTACKS[square] & pieceBB[KING | us]) \
+            | (magics.bishopAttacks(square, occupied)
+               & (pieceBB[BISHOP | us] | pieceBB[QUEEN | us])) \
+            | (magics.rookAttacks(square, occupied)
+               & (pieceBB[ROOK | us] | pieceBB[QUEEN | us]))
+
+    def _isAttacked(self, square: int, color: ColorChar, occupied: int) -> bool:
+        """Same lookup as _attackersTo, but stops at the first attacker found"""
+
+        pieceBB = self._pieceBB
+        us = COLOR_BITS[color]
+
+        if tables.KNIGHT_ATTACKS[square] & pieceBB[KNIGHT | us]:
+            return True
+        if tables.PAWN_ATTACKS[color.opponent][square] & pieceBB[PAWN | us]:
+            return True
+        if tables.KING_ATTACKS[square] & pieceBB[KING | us]:
+            return True
+
+        # only look along rays that could hold a slider at all
+        diagonal = tables.BISHOP_RAYS[square] & (pieceBB[BISHOP | us] | pieceBB[QUEEN | us])
+        if diagonal and magics.bishopAttacks(square, occupied) & diagonal:
+            return True
+        orthogonal = tables.ROOK_RAYS[square] & (pieceBB[ROOK | us] | pieceBB[QUEEN | us])
+        return bool(orthogonal and magics.rookAttacks(square, occupied) & orthogonal)
 
     def executeMove(self, move: Move):
         """Performs the given move on the board"""
 
-        startRow, startCol = move.begin
-        endRow, endCol = move.end
+        self.makeMove(move)
 
-        piece = self._board[startRow][startCol]
-        if piece is None:
+    def makeMove(self, move: Move):
+        """Performs the given move in place, recording what is needed to revert it
+        with unmakeMove
+        """
+        self.makeMoveCode(encodeMove(move))
+
+    def makeMoveCode(self, code: int):
+        """makeMove for a packed move (see chessMove)"""
+
+        start = code & 0x3F
+        end = (code >> 6) & 0x3F
+        flag = code >> 12
+
+        piece = self._squares[start]
+        if not piece:
             raise Exception("Attempting to move non-existent piece!")
 
+        zobristKey = self._zobristKey
+
+        # En passant captures the pawn beside the start square, not on the end square
+        if flag == EP_CAPTURE:
+            capturedAt = (start & ~7) | (end & 7)
+            captured = self._squares[capturedAt]
+            self._setPiece(capturedAt, EMPTY)
+        else:
+            capturedAt = end
+            captured = self._squares[end]
+
         # Handles both moving & (normal) capturing
-        self._board[endRow][endCol] = piece
-        self._board[startRow][startCol] = None
-
-        # En passant capturing
-        if isinstance(move, EnPassant):
-            # remove the captured pawn, whose location depends on color
-            if self.toMove == ColorChar.WHITE:
-                self._board[endRow + 1][endCol] = None
-            else:
-                self._board[endRow - 1][endCol] = None
+        self._setPiece(start, EMPTY)
+        self._setPiece(end, piece)
 
         # Pawn promotion
-        if isinstance(move, PawnPromotion):
-            self._board[endRow][endCol] = self._createPiece(
-                move.toPiece, piece.color)
+        if flag >= PROMOTION:
+            self._setPiece(end, _PROMOTION_TYPES[flag & 3] | (piece & BLACK_BIT))
 
         # Castling
-        if isinstance(move, Castle):
-            if endCol > startCol:  # Kingside castle
-                rookRow, rookCol = self._rookHomeSquare(
-                    self.toMove, PieceChar.KING)
-                self._board[rookRow][rookCol] = None
-                self._board[endRow][endCol-1] = Rook(piece.color)
-            else:  # queenside
-                rookRow, rookCol = self._rookHomeSquare(
-                    self.toMove, PieceChar.QUEEN)
-                self._board[rookRow][rookCol] = None
-                self._board[endRow][endCol+1] = Rook(piece.color)
-
-        self._updateState(move)
-
-    def _updateState(self, move: Move):
+        elif flag in (KING_CASTLE, QUEEN_CASTLE):
+            rookStart, rookEnd = self._castleRookSquares(code)
+            self._setPiece(rookEnd, self._squares[rookStart])
+            self._setPiece(rookStart, EMPTY)
+
+        castleRights = {color: dict(rights) for color, rights in self.castleRights.items()}
+        epTarget = self.epTarget
+        halfMoveClock = self.halfMoveClock
+        fullMoveNumber = self.fullMoveNumber
+        fenStr = self._fenStr
+        maxRepetition = self._maxRepetition
+
+        self._updateState(code, piece, captured)
+
+        self._undoStack.append(MoveUndo(code, piece, captured, capturedAt, castleRights,
+                                        epTarget, halfMoveClock, fullMoveNumber, fenStr,
+                                        zobristKey, maxRepetition))
+
+    def unmakeMove(self) -> Move:
+        """Reverts the last move made with makeMove, returning that move"""
+
+        code = self.unmakeMoveCode()
+        return self.decodeMove(code)
+
+    def unmakeMoveCode(self) -> int:
+        """unmakeMove returning the packed move"""
+
+        if not self._undoStack:
+            raise Exception("No move to unmake!")
+        undo = self._undoStack.pop()
+        code = undo.move
+        flag = code >> 12
+
+        self.positionHistory[self._zobristKey] -= 1
+        if self.positionHistory[self._zobristKey] == 0:
+            del self.positionHistory[self._zobristKey]
+
+        if flag in (KING_CASTLE, QUEEN_CASTLE):
+            rookStart, rookEnd = self._castleRookSquares(code)
+            self._setPiece(rookStart, self._squares[rookEnd])
+            self._setPiece(rookEnd, EMPTY)
+
+        self._setPiece((code >> 6) & 0x3F, EMPTY)
+        self._setPiece(code & 0x3F, undo.movedPiece)
+        self._setPiece(undo.capturedAt, undo.captured)
+
+        self.toMove = self.toMove.opponent
+        self.castleRights = undo.castleRights
+        self.epTarget = undo.epTarget
+        self.halfMoveClock = undo.halfMoveClock
+        self.fullMoveNumber = undo.fullMoveNumber
+        self._fenStr = undo.fenStr
+        self._zobristKey = undo.zobristKey
+        self._maxRepetition = undo.maxRepetition
+
+        return code
+
+    def _castleRookSquares(self, code: int) -> tuple[int, int]:
+        """Returns the squares the castling rook starts and ends on for the given castle"""
+
+        # The rook shares the king's row, so this holds for either side to move
+        end = (code >> 6) & 0x3F
+        if code >> 12 == KING_CASTLE:
+            return end | 7, end - 1
+        return end & ~7, end + 1
+
+    def _updateState(self, code: int, movedPiece: int, captured: int):
+
+        begin = bitboard.squareCoord(code & 0x3F)
+        end = bitboard.squareCoord((code >> 6) & 0x3F)
+
+        # hash out the old rights and en passant file; the new ones go back in below
+        self._zobristKey ^= zobrist.castleKey(self.castleRights) ^ zobrist.epKey(self.epTarget)
 
         # Castling rights
-        movedPiece = self. _board[move.end[0]][move.end[1]]
-        if isinstance(movedPiece, King):
+        if movedPiece & TYPE_MASK == KING:
             self.castleRights[self.toMove][PieceChar.KING] = False
             self.castleRights[self.toMove][PieceChar.QUEEN] = False
 
-        elif isinstance(movedPiece, Rook):
+        elif movedPiece & TYPE_MASK == ROOK:
             for pieceChar in (PieceChar.KING, PieceChar.QUEEN):
-                if move.begin == self._rookHomeSquare(self.toMove, pieceChar):
+                if begin == self._rookHomeSquare(self.toMove, pieceChar):
                     self.castleRights[self.toMove][pieceChar] = False
 
-        # En passant availability
-        if isinstance(move, PawnDoublePush):
-            row, col = move.end
-            if self.toMove == ColorChar.WHITE:
-                self.epTarget = (row + 1, col)
-            else:
-                self.epTarget = (row - 1, col)
+        # Capturing a rook on its home square also removes that castling option
+        if captured & TYPE_MASK == ROOK:
+            for pieceChar in (PieceChar.KING, PieceChar.QUEEN):
+                if end == self._rookHomeSquare(self.toMove.opponent, pieceChar):
+                    self.castleRights[self.toMove.opponent][pieceChar] = False
+
+        # En passant availability: the square the pawn skipped over
+        if code >> 12 == DOUBLE_PUSH:
+            self.epTarget = ((begin[0] + end[0]) // 2, end[1])
         else:
             self.epTarget = None
 
         # Half-move clock can be reset by pawn moves or capture
-        if isinstance(move, (PawnPush, Capture)):
+        if movedPiece & TYPE_MASK == PAWN or captured:
             self.halfMoveClock = 0
         else:
             self.halfMoveClock += 1
@@ -414,220 +873,278 @@ class Position:
         if self.toMove == ColorChar.WHITE:
             self.fullMoveNumber += 1
 
-        self._updateFEN()
+        self._zobristKey ^= zobrist.castleKey(self.castleRights) ^ zobrist.epKey(self.epTarget) \
+            ^ zobrist.BLACK_TO_MOVE
+
+        self._fenStr = None
 
         # add the updated position to the positionHistory
-        positionHistoryStr = self._getPositionHistoryStr()
-        self.positionHistory.setdefault(positionHistoryStr, 0)
-        self.positionHistory[positionHistoryStr] += 1
-
-        # print( self.positionHistory )
-
-    def _getPositionHistoryStr(self):
-        return ' '.join(self.fenStr.split(' ')[0:4])
-
-    def _updateFEN(self):
-        tempBoardStr = self._getBoardStr()
-
-        # self.castleRights
-        castleStr = ''
-        if self.castleRights[ColorChar.WHITE][PieceChar.KING]:
-            castleStr += 'K'
-        if self.castleRights[ColorChar.WHITE][PieceChar.QUEEN]:
-            castleStr += 'Q'
-        if self.castleRights[ColorChar.BLACK][PieceChar.KING]:
-            castleStr += 'k'
-        if self.castleRights[ColorChar.BLACK][PieceChar.QUEEN]:
-            castleStr += 'q'
-
-        if len(castleStr) == 0:
-            castleStr = '-'
-
-        epStr = '-' if not self.epTarget else FEN.coordToSquare(self.epTarget)
-
-        self.fenStr = ' '.join([tempBoardStr, self.toMove.value, castleStr, epStr, str(
-            self.halfMoveClock), str(self.fullMoveNumber)])
-
-    def _getBoardStr(self):
-        outstr = ''
-        for row in range(self.numRows):
-            j = 0
-            for col in range(self.numCols):
-                if self._board[row][col] is None:
-                    j += 1
-                else:
-                    if j != 0:
-                        outstr = outstr + \
-                            str(j) + str(self._board[row][col])
-                    else:
-                        outstr = outstr + str(self._board[row][col])
-                    j = 0
-
-            if j != 0:
-                outstr += str(j)
-
-            outstr += '/'
-
-        return outstr[:-1]    # remove accidentally over included '/'
+        repetitions = self.positionHistory.get(self._zobristKey, 0) + 1
+        self.positionHistory[self._zobristKey] = repetitions
+        if repetitions > self._maxRepetition:
+            self._maxRepetition = repetitions
 
     def moveToAlgebraic(self, move: Move) -> str: 
         """ call BEFORE move is executed, express the algebraic notation of the move. """ 
-        # assume that move has not yet been executed
-        beginrow, begincol  = move.begin
-        endrow, endcol  = move.end
-        piece = self._board[beginrow][begincol] 
-
-        # add a + for check. # for checkmate eventually 
-        checkStr = '' 
-        if self.putIntoCheckmate(move): 
-            checkStr = '#' 
-        elif self.putIntoCheck( move ): 
-            checkStr = '+'
-
-        if isinstance( move, Castle): 
-            if endcol > begincol: 
-                return '0-0' + checkStr  # kingside castle 
-            else: 
-                return '0-0-0' + checkStr  # queenside castle 
-
-        promoStr = ''
-        # if  promotion... (Q)  
-        if isinstance( move, PawnPromotion) : 
-            promoStr = '={}'.format(move.toPiece.value.upper())  
-
-        captStr = '' 
-        if isinstance( move, Capture ): 
-            captStr = 'x'
-
-        if isinstance( piece, Pawn): 
-            if isinstance( move, Capture ): 
-                headStr = FEN.coordToSquare( move.begin ) [0] 
-            else: 
-                headStr = '' 
-       
-        else: 
-
-            headStr = piece.char.value.upper()
-
-            # check no other piece can get to that square.
-            allMoves = self.getLegalMoves(self.toMove)
-            for tempMove in allMoves:
-                if (tempMove.end != move.end) or (tempMove.begin == move.begin):
-                    continue
-
-                tempPiece = self._board[tempMove.begin[0]][tempMove.begin[1]]
-                if isinstance(tempPiece, type(piece)):
-                    # Another piece of the same type can move to the end square
-
-                    if tempMove.begin[0] == move.begin[0]:
-                        # get letter of beginning square
-                        headStr += FEN.coordToSquare(move.begin)[0]
-                    else:
-                        # get number of beginning square
-                        headStr += FEN.coordToSquare(move.begin)[1]
-
-        return headStr + captStr + FEN.coordToSquare(move.end) + promoStr + checkStr
+
+        return self.movesToSAN([move])[0]
+
+    def movesToSAN(self, moves: list[Move]) -> list[str]:
+        """Standard algebraic notation for each of the given legal moves of the side
+        to move (call BEFORE they are made).
+
+        The whole batch shares one legal move generation for disambiguation, and
+        check is detected without making the move; only moves that give check are
+        played out, to see whether they mate.
+        """
+        # (end square, piece code) -> start squares of the legal moves landing there
+        origins: dict[tuple[int, int], list[int]] = {}
+        for code in self.getLegalMoveCodes(self.toMove):
+            start = code & 0x3F
+            starts = origins.setdefault(((code >> 6) & 0x3F, self._squares[start]), [])
+            if start not in starts:     # promotions repeat the same start square
+                starts.append(start)
+
+        return [self._codeToSAN(encodeMove(move), origins) for move in moves]
+
+    def _codeToSAN(self, code: int, origins: dict[tuple[int, int], list[int]]) -> str:
+        start = code & 0x3F
+        end = (code >> 6) & 0x3F
+        flag = code >> 12
+        piece = self._squares[start]
+
+        if flag == KING_CASTLE:
+            san = '0-0'
+        elif flag == QUEEN_CASTLE:
+            san = '0-0-0'
+        else:
+            captStr = 'x' if isCapture(code) else ''
+            if piece & TYPE_MASK == PAWN:
+                headStr = FEN.SQUARE_NAMES[start][0] if captStr else ''
+            else:
+                headStr = PIECES[piece].char.value.upper() \
+                    + self._disambiguation(start, origins.get((end, piece), ()))
+
+            san = headStr + captStr + FEN.SQUARE_NAMES[end]
+            if flag >= PROMOTION:
+                san += '=' + PROMOTION_PIECES[flag & 3].value.upper()
+
+        if self._givesCheck(code):
+            self.makeMoveCode(code)
+            mate = not self.hasLegalMove()
+            self.unmakeMoveCode()
+            san += '#' if mate else '+'
+
+        return san
+
+    @staticmethod
+    def _disambiguation(start: int, starts: list[int]) -> str:
+        """The file, rank or square to add when other pieces of the same type can
+        reach the same square (file first, as SAN prefers)
+        """
+        others = [other for other in starts if other != start]
+        if not others:
+            return ''
+
+        name = FEN.SQUARE_NAMES[start]
+        if all(other % bitboard.NUM_COLS != start % bitboard.NUM_COLS for other in others):
+            return name[0]
+        if all(other // bitboard.NUM_COLS != start // bitboard.NUM_COLS for other in others):
+            return name[1]
+        return name
+
+    def _givesCheck(self, code: int) -> bool:
+        """Whether the packed legal move checks the opponent, either directly or by
+        uncovering one of our sliders, worked out without making it
+        """
+        start = code & 0x3F
+        end = (code >> 6) & 0x3F
+        flag = code >> 12
+        piece = self._squares[start]
+        us = piece & BLACK_BIT
+
+        kingSquare = self._kingSquares[(piece >> 3) ^ 1]
+        if kingSquare is None:
+            return False
+
+        moved = 1 << start
+        occupied = (self._occupied ^ moved) | (1 << end)
+        attacker, attackFrom = piece, end
+
+        if flag >= PROMOTION:
+            attacker = _PROMOTION_TYPES[flag & 3] | us
+        elif flag == EP_CAPTURE:
+            occupied ^= 1 << ((start & ~7) | (end & 7))
+        elif flag in (KING_CASTLE, QUEEN_CASTLE):
+            # the rook is the piece that can give check
+            rookStart, rookEnd = self._castleRookSquares(code)
+            moved |= 1 << rookStart
+            occupied = (occupied ^ (1 << rookStart)) | (1 << rookEnd)
+            attacker, attackFrom = ROOK | us, rookEnd
+
+        # direct check from the moved (or promoted) piece
+        if attacker & TYPE_MASK != KING \
+                and self._pieceAttacks(attackFrom, attacker, occupied) & (1 << kingSquare):
+            return True
+
+        # discovered check from a slider that stayed put
+        pieceBB = self._pieceBB
+        diagonal = (pieceBB[BISHOP | us] | pieceBB[QUEEN | us]) & ~moved
+        if diagonal and magics.bishopAttacks(kingSquare, occupied) & diagonal:
+            return True
+        orthogonal = (pieceBB[ROOK | us] | pieceBB[QUEEN | us]) & ~moved
+        return bool(orthogonal and magics.rookAttacks(kingSquare, occupied) & orthogonal)
+
+    def perft(self, depth: int) -> int:
+        """Counts the leaf nodes of the legal move tree to the given depth.
+
+        The counts for well-known positions are published, which makes this the
+        correctness check (and benchmark) for move generation; see perft.py.
+        """
+        return self._perft(depth, 0)
+
+    def _perft(self, depth: int, ply: int) -> int:
+        moves = self.getLegalMoveCodes(self.toMove, self.moveBuffer(ply))
+        if depth <= 1:
+            return len(moves) if depth == 1 else 1
+
+        nodes = 0
+        for code in moves:
+            self.makeMoveCode(code)
+            nodes += self._perft(depth - 1, ply + 1)
+            self.unmakeMoveCode()
+        return nodes
+
+    def moveBuffer(self, ply: int) -> MoveBuffer:
+        """A move buffer owned by this position for the given search ply, so a
+        recursive search can reuse one array per ply instead of allocating lists
+        """
+        while len(self._plyBuffers) <= ply:
+            self._plyBuffers.append(array('H'))
+        return self._plyBuffers[ply]
+
+    def divide(self, depth: int) -> dict[str, int]:
+        """Splits perft(depth) by root move, keyed by the move in coordinate notation.
+        Comparing this against another engine narrows a perft mismatch down to a move.
+        """
+        counts = {}
+        for move in self.getLegalMoves(self.toMove):
+            self.makeMove(move)
+            counts[move.toCoordinateNotation()] = self.perft(depth - 1)
+            self.unmakeMove()
+        return counts
 
     def findKing(self, color: ColorChar) -> Coord:
         """Returns the position of the king of the given color"""
 
-        for row, col, piece in self.enumerateBoard():
-            if isinstance(piece, King) and piece.color == color:
-                return (row, col)
-
-        raise Exception(f"No {color} king found!")
+        kingSquare = self._kingSquares[COLOR_INDEX[color]]
+        if kingSquare is None:
+            raise Exception(f"No {color} king found!")
+        return bitboard.squareCoord(kingSquare)
 
     def inCheck(self, color: ColorChar) -> bool:
         """Returns whether the player of the given color is in check"""
 
-        kingPos = self.findKing(color)
-        return self.isSquareAttacked(kingPos, color.opponent)
+        kingSquare = self._kingSquares[COLOR_INDEX[color]]
+        if kingSquare is None:
+            raise Exception(f"No {color} king found!")
+        return self._isAttacked(kingSquare, color.opponent, self._occupied)
 
     def moveIntoCheck(self, move: Move) -> bool:
         """Returns whether the given move would put the player toMove in check."""
 
-        tempPosition = Position(self.fenStr)
-        tempPosition.executeMove(move)
+        color = self.toMove
+        self.makeMove(move)
+        intoCheck = self.inCheck(color)
+        self.unmakeMove()
 
-        return tempPosition.inCheck(self.toMove)
+        return intoCheck
 
     def putIntoCheck(self, move: Move) -> bool: 
         """Returns whether the given move would put the opponent into check. """ 
-        
-        tempPosition = Position(self.fenStr)
-        tempPosition.executeMove(move)
 
-        return tempPosition.inCheck(tempPosition.toMove)
+        self.makeMove(move)
+        check = self.inCheck(self.toMove)
+        self.unmakeMove()
+
+        return check
 
     def putIntoCheckmate(self, move: Move) -> bool:
-        """Returns whether the given move would put the opponent into check. """ 
+        """Returns whether the given move would put the opponent into checkmate. """ 
 
-        tempPosition = Position(self.fenStr)
-        tempPosition.executeMove(move)
-        legalMoves = tempPosition.getLegalMoves(tempPosition.toMove) 
+        self.makeMove(move)
+        checkmate = self.inCheck(self.toMove) and not self.hasLegalMove()
+        self.unmakeMove()
 
-        return self.putIntoCheck(move) and len( legalMoves) == 0 
+        return checkmate
 
 
     def countPiece(self, pieceToFind: type[Piece]) -> dict[ColorChar, int]:
         """Find the number of piece of each color on the board"""
 
-        countDict = {ColorChar.WHITE: 0, ColorChar.BLACK: 0}
-        for _, _, piece in self.enumerateBoard():
-            if isinstance(piece, pieceToFind):
-                countDict[piece.color] += 1
-        return countDict
+        return {color: bitboard.popCount(self._pieceBB[pieceToFind.typeCode | COLOR_BITS[color]])
+                for color in ColorChar}
 
     def illegalPawnPlacement(self) -> bool:
         """ detects if pawns are in invalid positions. (1st or last rank) """
-        for row in (0, self.numRows-1):
-            for piece in self._board[row]:
-                if isinstance(piece, Pawn):
-                    return True
+        pawns = self._pieceBB[PAWN] | self._pieceBB[PAWN | BLACK_BIT]
+        return bool(pawns & (bitboard.ROW_0 | bitboard.ROW_7))
 
-        return False
+    def getPositionStatus(self, legalMoves: (list[Move] | None) = None) -> PositionStatus:
+        """ returns a string the reports the status of a position and message describing
 
-    def getPositionStatus(self) -> PositionStatus:
-        """ returns a string the reports the status of a position and message describing """
+        The counter checks come first; the legal moves are only looked at once the
+        game is otherwise still going (pass them in if they are already known).
+        """
+        white, black = COLOR_BITS[ColorChar.WHITE], COLOR_BITS[ColorChar.BLACK]
 
         # check if position is valid based on number of kings and if a
         # check had been missed and if pawns aren't in valid position
-        kingCount = self.countPiece(King)
-        if (kingCount[ColorChar.WHITE] != 1) or (kingCount[ColorChar.BLACK] != 1) \
-                or self.inCheck(self.toMove.opponent) or self.illegalPawnPlacement():
+        if bitboard.popCount(self._pieceBB[KING | white]) != 1 \
+                or bitboard.popCount(self._pieceBB[KING | black]) != 1 \
+                or self.illegalPawnPlacement() or self.inCheck(self.toMove.opponent):
             return PositionStatus.INVALID
 
-        if self.halfMoveClock == 100:
+        if self.halfMoveClock >= 100:
             return PositionStatus.FIFTY_MOVE_DRAW
 
-        if len(self.getLegalMoves(self.toMove)) == 0:
-            if self.inCheck(self.toMove):
-                return PositionStatus.WHITE_WINS if self.toMove == ColorChar.WHITE \
-                    else PositionStatus.BLACK_WINS
-            return PositionStatus.STALEMATE
-
-        if any(value > 2 for value in self.positionHistory.values()):
+        if self._maxRepetition > 2:
             return PositionStatus.THREEFOLD_DRAW
 
         # if the material is not enough to mate
-        material = self.materialCount()
-        pawnCount = self.countPiece(Pawn)
-        if not any(val > 0 for val in pawnCount.values()) \
-                and material[ColorChar.WHITE] + material[ColorChar.BLACK] < 4:
+        if not (self._pieceBB[PAWN | white] or self._pieceBB[PAWN | black]) \
+                and self._material[0] + self._material[1] < 4:
             # for now ignore insufficient draw of K + B vs K + B if bishop on same color squares
             return PositionStatus.INSUFFICIENT_DRAW
 
+        hasMoves = bool(legalMoves) if legalMoves is not None \
+            else self.hasLegalMove()
+        if not hasMoves:
+            if self.inCheck(self.toMove):
+                # the side to move has been mated
+                return PositionStatus.BLACK_WINS if self.toMove == ColorChar.WHITE \
+                    else PositionStatus.WHITE_WINS
+            return PositionStatus.STALEMATE
+
         return PositionStatus.IN_PLAY
 
+    @property
+    def maxRepetition(self) -> int:
+        """The most times any position in positionHistory has occurred"""
+
+        return self._maxRepetition
+
     # # Functions used to evaluate the position --------------------------------
 
     def materialCount(self) -> dict[ColorChar, int]:
         """Counts the relative value of material on the board for white and black"""
-        material = {ColorChar.WHITE: 0, ColorChar.BLACK: 0}
-        for _, _, piece in self.enumerateBoard():
-            if piece and not isinstance(piece, King):
-                material[piece.color] += piece.value
 
-        return material
+        return {color: self._material[COLOR_INDEX[color]] for color in ColorChar}
+
+    def materialBalance(self) -> int:
+        """materialCount of the side to move minus that of its opponent"""
+
+        us = COLOR_INDEX[self.toMove]
+        return self._material[us] - self._material[us ^ 1]
 
     # def findCheckmate(self) ->
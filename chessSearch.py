@@ -0,0 +1,410 @@
+#!/bin/python3
+# chessSearch.py
+
+"""
+Game tree search for the computer players.
+
+Searcher runs a negamax alpha-beta search with iterative deepening: depth 1,
+then 2, and so on, each iteration trying the previous iteration's best move
+first. Within an iteration, principal variation search (PVS) gives the first
+move of each node a full window and every later move a null window, only
+re-searching when a later move turns out better after all.
+
+Results are kept in a TranspositionTable shared across searches: a position
+reached again (by transposition, in a later iteration or on a later move)
+supplies its best move to try first and, when searched deep enough, a score
+that ends the node outright. Within each stage the moves are ordered by a
+MoveOrderer (MVV-LVA captures, killer moves, history).
+
+At the horizon a quiescence search plays on the captures and promotions until
+the position is quiet, so a capture sequence is never cut off halfway. The
+side to move may stand pat on the static evaluation instead of capturing;
+captures that cannot lift the score to alpha even with a margin (delta
+pruning), and captures that lose material by static exchange evaluation, are
+not played at all.
+
+A search is bounded by SearchLimits: a depth, a node count, a time per move or
+a sudden-death clock with increment. The limits, and a stop Event that another
+thread may set, are checked every CHECK_INTERVAL nodes; once one is hit the
+search unwinds and returns the deepest completed iteration. Only the stop flag
+can cut the first iteration short, so a bounded search always has a move.
+
+A ponder search runs on the opponent's time, from the position after the reply
+it expects, with no time or node bound. If the opponent does play that reply,
+setting the search's ponderHit Event turns it into an ordinary search whose
+bounds start counting then, keeping everything searched so far; otherwise it
+is simply stopped.
+
+Scores are in centipawns from the side to move's point of view. Mates score
+MATE_SCORE less the number of plies to the mate, so shorter mates score higher.
+"""
+
+from array import array
+import threading
+import time
+from typing import NamedTuple
+
+from chessMove import NULL_MOVE
+from chessPosition import Position, STAGE_CAPTURES, STAGE_QUIETS
+from moveOrdering import MoveOrderer
+from transpositionTable import TranspositionTable, DEFAULT_MEGABYTES, EXACT, LOWER, UPPER
+
+DEFAULT_DEPTH = 3
+
+PAWN_VALUE = 100    # centipawns per point of Position.materialCount
+MATE_SCORE = 100000
+INFINITY = MATE_SCORE + 1
+
+# scores beyond this are mates (MATE_SCORE minus at most MAX_PLY)
+MAX_PLY = 128
+MATE_BOUND = MATE_SCORE - MAX_PLY
+
+# quiescence: a capture is skipped when even winning this much beyond its victim
+# could not raise the score to alpha
+DELTA_MARGIN = 2 * PAWN_VALUE
+
+CHECK_INTERVAL = 1024   # nodes between looks at the clock and the stop flag
+
+# sudden death: the clock is spread over this many more moves, and one move
+# never takes more than this fraction of it
+MOVES_TO_GO = 30
+MAX_CLOCK_FRACTION = 0.25
+
+# another iteration is not started once this fraction of the time budget is used,
+# as it would most likely be cut off before finishing
+SOFT_TIME_FRACTION = 0.5
+
+
+class SearchLimits(NamedTuple):
+    """What bounds one search; None means no bound of that kind"""
+
+    depth: (int | None) = None
+    nodes: (int | None) = None
+    moveTime: (float | None) = None     # seconds for this move
+    clock: (float | None) = None        # seconds left on the clock (sudden death)
+    increment: float = 0.0              # seconds added to the clock after each move
+
+    def timeBudget(self) -> (float | None):
+        """Seconds to spend on the move, from moveTime and the clock"""
+
+        budgets = []
+        if self.moveTime is not None:
+            budgets.append(self.moveTime)
+        if self.clock is not None:
+            budgets.append(min(self.clock / MOVES_TO_GO + self.increment,
+                               self.clock * MAX_CLOCK_FRACTION))
+        return min(budgets) if budgets else None
+
+
+class _SearchStopped(Exception):
+    """Unwinds the search once a limit is hit"""
+
+
+class SearchResult(NamedTuple):
+    """The outcome of Searcher.search"""
+
+    bestMove: int       # packed, see chessMove (NULL_MOVE if there was no legal move)
+    score: int          # centipawns for the side to move
+    depth: int          # the deepest completed iteration
+    pv: list[int]       # principal variation, packed, starting with bestMove
+    nodes: int
+    seconds: float
+
+    @property
+    def nps(self) -> float:
+        """Nodes searched per second"""
+
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+
+class Searcher:
+    """Negamax alpha-beta search with iterative deepening and PVS"""
+
+    maxDepth: int
+    nodes: int
+    table: TranspositionTable
+    ordering: MoveOrderer
+
+    _pvTable: list[array]   # _pvTable[ply] holds the best line found from that ply
+    _previousPV: list[int]  # the last completed iteration's line, tried first
+    _rootScore: int         # score of the best root move so far in this iteration
+
+    _stopEvent: threading.Event
+    _deadline: (float | None)   # time.perf_counter() value
+    _nodeLimit: (int | None)
+    _limits: SearchLimits       # of the running search
+    _budgetStart: float         # when the time budget started (the ponder hit, when pondering)
+    _ponderHit: (threading.Event | None)    # set while the search is still pondering
+    _limitsActive: bool         # the time and node bounds apply (after the first iteration)
+    _nextCheck: int             # node count at which the limits are next checked
+
+    def __init__(self, maxDepth: int = DEFAULT_DEPTH, table: (TranspositionTable | None) = None):
+        """
+        Args:
+            maxDepth (int): default number of plies to search
+            table (TranspositionTable): table to use, e.g. one shared between
+                searchers (a new DEFAULT_MEGABYTES table if None)
+        """
+        self.maxDepth = maxDepth
+        self.nodes = 0
+        self.table = TranspositionTable(DEFAULT_MEGABYTES) if table is None else table
+        self.ordering = MoveOrderer(MAX_PLY)
+        self._pvTable = [array('H') for _ in range(MAX_PLY + 1)]
+        self._previousPV = []
+        self._rootScore = 0
+        self._stopEvent = threading.Event()
+
+    def evaluate(self, position: Position) -> int:
+        """Static evaluation in centipawns for the side to move (material only)"""
+
+        return PAWN_VALUE * position.materialBalance()
+
+    def search(self, position: Position, maxDepth: (int | None) = None,
+               limits: (SearchLimits | None) = None,
+               stopEvent: (threading.Event | None) = None,
+               ponderHit: (threading.Event | None) = None) -> SearchResult:
+        """Searches the position (left unchanged afterwards) one iteration at a time,
+        returning the result of the deepest iteration completed
+
+        Args:
+            position (Position): the position to search
+            maxDepth (int): plies to search when no limits are given (self.maxDepth if None)
+            limits (SearchLimits): bounds on the search; without a depth bound it
+                deepens until another bound is hit
+            stopEvent (threading.Event): set from another thread to end the search
+                early (see also stop)
+            ponderHit (threading.Event): makes this a ponder search, without the time
+                and node bounds until the event is set
+        """
+        if limits is None:
+            limits = SearchLimits(depth=self.maxDepth if maxDepth is None else maxDepth)
+        maxDepth = MAX_PLY if limits.depth is None else min(limits.depth, MAX_PLY)
+
+        start = time.perf_counter()
+        self._limits = limits
+        self._ponderHit = ponderHit
+        self._deadline = None
+        self._nodeLimit = None
+        self.nodes = 0
+        self._checkPonderHit()
+        self._stopEvent = threading.Event() if stopEvent is None else stopEvent
+        self._nextCheck = 0
+        self._limitsActive = False
+        self._previousPV = []
+        del self._pvTable[0][:]
+        self.table.newSearch()
+        self.ordering.newSearch()
+
+        result = SearchResult(NULL_MOVE, 0, 0, [], 0, 0.0)
+        for depth in range(1, maxDepth + 1):
+            try:
+                score = self._negamax(position, depth, -INFINITY, INFINITY, 0)
+            except _SearchStopped:
+                # with no iteration completed, the best root move so far still beats none
+                if result.depth == 0 and self._pvTable[0]:
+                    pv = list(self._pvTable[0])
+                    result = SearchResult(pv[0], self._rootScore, 0, pv, 0, 0.0)
+                result = result._replace(nodes=self.nodes, seconds=time.perf_counter() - start)
+                break
+
+            pv = list(self._pvTable[0])
+            self._previousPV = pv
+            self._limitsActive = True
+            elapsed = time.perf_counter() - start
+            result = SearchResult(pv[0] if pv else NULL_MOVE, score, depth, pv,
+                                  self.nodes, elapsed)
+
+            # nothing to search, or a forced mate has been found
+            if not pv or abs(score) >= MATE_BOUND:
+                break
+            if self._ponderHit is not None:
+                self._checkPonderHit()
+            budget = limits.timeBudget()
+            if self._ponderHit is None and budget is not None \
+                    and time.perf_counter() - self._budgetStart >= budget * SOFT_TIME_FRACTION:
+                break
+
+        return result
+
+    def _checkPonderHit(self):
+        # the bounds start counting once the search is no longer pondering
+        if self._ponderHit is not None and not self._ponderHit.is_set():
+            return
+        self._ponderHit = None
+        self._budgetStart = time.perf_counter()
+        budget = self._limits.timeBudget()
+        self._deadline = None if budget is None else self._budgetStart + budget
+        self._nodeLimit = None if self._limits.nodes is None else self.nodes + self._limits.nodes
+
+    def stop(self):
+        """Ends the running search (safe to call from another thread)"""
+
+        self._stopEvent.set()
+
+    def _checkLimits(self):
+        if self._stopEvent.is_set():
+            raise _SearchStopped()
+        if self._ponderHit is not None:
+            self._checkPonderHit()
+        if self._limitsActive \
+                and ((self._deadline is not None and time.perf_counter() >= self._deadline)
+                     or (self._nodeLimit is not None and self.nodes >= self._nodeLimit)):
+            raise _SearchStopped()
+
+        self._nextCheck = self.nodes + CHECK_INTERVAL
+        if self._nodeLimit is not None:
+            self._nextCheck = min(self._nextCheck, self._nodeLimit)
+
+    def _negamax(self, position: Position, depth: int, alpha: int, beta: int, ply: int) -> int:
+        if depth <= 0:
+            return self._quiesce(position, alpha, beta, ply)
+
+        self.nodes += 1
+        if self.nodes >= self._nextCheck:
+            self._checkLimits()
+        pvLine = self._pvTable[ply]
+        del pvLine[:]
+
+        if ply > 0 and self._isDraw(position):
+            return 0
+
+        if ply >= MAX_PLY:
+            return self.evaluate(position)
+
+        table = self.table
+        key = position.zobristKey
+        entry = table.probe(key)
+        hashMove = NULL_MOVE
+        if entry is not None:
+            hashMove = entry.move
+            # the cutoffs are left to null-window nodes so the principal variation stays whole
+            if entry.depth >= depth and beta - alpha == 1:
+                score = _scoreFromTable(entry.score, ply)
+                if entry.bound == EXACT \
+                        or (entry.bound == LOWER and score >= beta) \
+                        or (entry.bound == UPPER and score <= alpha):
+                    return score
+        if hashMove == NULL_MOVE and ply < len(self._previousPV):
+            # the previous iteration's line is tried first (iterMoves skips it if illegal here)
+            hashMove = self._previousPV[ply]
+
+        alphaOriginal = alpha
+        bestScore = -INFINITY
+        bestMove = NULL_MOVE
+        moves = position.iterMoves(hashMove, sortKey=self.ordering.sortKey(position, ply))
+        moveNumber = -1
+        for moveNumber, code in enumerate(moves):
+            position.makeMoveCode(code)
+            try:
+                if moveNumber == 0:
+                    score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+                else:
+                    # null window: only prove the move is no better than alpha
+                    score = -self._negamax(position, depth - 1, -alpha - 1, -alpha, ply + 1)
+                    if alpha < score < beta:
+                        score = -self._negamax(position, depth - 1, -beta, -alpha, ply + 1)
+            finally:
+                # also when the search is stopped, so the position comes back unchanged
+                position.unmakeMoveCode()
+
+            if score > bestScore:
+                bestScore = score
+                bestMove = code
+            if score > alpha:
+                alpha = score
+                del pvLine[:]
+                pvLine.append(code)
+                pvLine.extend(self._pvTable[ply + 1])
+                if ply == 0:
+                    self._rootScore = score
+            if alpha >= beta:
+                self.ordering.recordCutoff(position, code, depth, ply, moveNumber)
+                break
+
+        if moveNumber < 0:
+            bestScore = -(MATE_SCORE - ply) if position.inCheck(position.toMove) else 0
+            bound = EXACT
+        elif bestScore >= beta:
+            bound = LOWER
+        elif bestScore > alphaOriginal:
+            bound = EXACT
+        else:
+            # failed low: no move is known to be best
+            bound = UPPER
+            bestMove = NULL_MOVE
+
+        table.store(key, bestMove, depth, _scoreToTable(bestScore, ply), bound)
+        return bestScore
+
+    def _quiesce(self, position: Position, alpha: int, beta: int, ply: int) -> int:
+        self.nodes += 1
+        if self.nodes >= self._nextCheck:
+            self._checkLimits()
+        del self._pvTable[ply][:]
+
+        if self._isDraw(position):
+            return 0
+
+        # in check there is no standing pat: every evasion is searched
+        inCheck = position.inCheck(position.toMove)
+        if inCheck:
+            standPat = bestScore = -INFINITY
+            stage = STAGE_QUIETS
+        else:
+            standPat = bestScore = self.evaluate(position)
+            if standPat >= beta:
+                return standPat
+            alpha = max(alpha, standPat)
+            stage = STAGE_CAPTURES
+
+        if ply >= MAX_PLY:
+            return self.evaluate(position)
+
+        searchedAny = False
+        for code in position.iterMoves(stage=stage, sortKey=self.ordering.sortKey(position, ply)):
+            if not inCheck:
+                if standPat + PAWN_VALUE * position.captureGain(code) + DELTA_MARGIN <= alpha:
+                    continue
+                if position.staticExchange(code) < 0:
+                    continue
+
+            position.makeMoveCode(code)
+            try:
+                score = -self._quiesce(position, -beta, -alpha, ply + 1)
+            finally:
+                position.unmakeMoveCode()
+            searchedAny = True
+
+            if score > bestScore:
+                bestScore = score
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        break
+
+        if inCheck and not searchedAny:
+            return -(MATE_SCORE - ply)
+        return bestScore
+
+    @staticmethod
+    def _isDraw(position: Position) -> bool:
+        # a position repeated once inside the search is scored as the draw it can become
+        return position.halfMoveClock >= 100 \
+            or position.positionHistory.get(position.zobristKey, 0) > 1
+
+
+def _scoreToTable(score: int, ply: int) -> int:
+    # mates are stored as distance from the stored node, not from the root
+    if score >= MATE_BOUND:
+        return score + ply
+    if score <= -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _scoreFromTable(score: int, ply: int) -> int:
+    if score >= MATE_BOUND:
+        return score - ply
+    if score <= -MATE_BOUND:
+        return score + ply
+    return score
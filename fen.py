@@ -3,31 +3,137 @@
 # 2022.07.26
 # fen.py
 
-from typedefs import Coord
+"""
+Forsyth-Edwards Notation (FEN) helpers.
+
+Square names and piece characters are converted through tables built once at
+import, and the piece placement field is written and read with str.replace /
+str.translate over the whole board rather than square by square, so bulk FEN
+import and export stays cheap.
+"""
+
+from typing import NamedTuple
+
+from typedefs import PieceChar, ColorChar, Coord
+from bitboard import NUM_ROWS, NUM_COLS, NUM_SQUARES
+from chessPiece import PIECES, EMPTY
 
 
 STANDARD_START_POSITION = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
 
+FILES = 'abcdefgh'
+RANKS = '87654321'    # row 0 is the eighth rank
+
+# square number -> name ('a8', 'b8', ... 'h1')
+SQUARE_NAMES = [file + rank for rank in RANKS for file in FILES]
+
+_SQUARE_COORDS = {name: divmod(square, NUM_COLS) for square, name in enumerate(SQUARE_NAMES)}
+_COORD_NAMES = {coord: name for name, coord in _SQUARE_COORDS.items()}
+
+# piece code <-> placement character ('1' stands for an empty square while a row is expanded)
+_CODE_CHARS = ['1' if piece is None else str(piece) for piece in PIECES]
+_CHAR_CODES = {char: code for code, char in enumerate(_CODE_CHARS) if PIECES[code] is not None}
+_CHAR_CODES['1'] = EMPTY
+
+# longest runs first, so eight empty squares become '8' rather than '71'
+_EMPTY_RUNS = tuple(('1' * length, str(length)) for length in range(NUM_COLS, 1, -1))
+_EXPAND_DIGITS = str.maketrans({str(length): '1' * length for length in range(2, NUM_COLS + 1)})
+
+_CASTLE_CHARS = ((ColorChar.WHITE, PieceChar.KING, 'K'), (ColorChar.WHITE, PieceChar.QUEEN, 'Q'),
+                 (ColorChar.BLACK, PieceChar.KING, 'k'), (ColorChar.BLACK, PieceChar.QUEEN, 'q'))
+
+CastleRights = dict[ColorChar, dict[PieceChar, bool]]
+
+
+class FENFields(NamedTuple):
+    """The six fields of a FEN string, parsed"""
+
+    squares: list[int]      # piece code per square number, see chessPiece
+    toMove: ColorChar
+    castleRights: CastleRights
+    epTarget: (Coord | None)
+    halfMoveClock: int
+    fullMoveNumber: int
+
 
 def squareToCoord(square: str) -> Coord:
     """Converts a square location a1 etc. to the corresponding (row, col) tuple"""
-    rowDict = {'1': 7, '2': 6, '3': 5, '4': 4, '5': 3, '6': 2, '7': 1, '8': 0}
-    colDict = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5, 'g': 6, 'h': 7}
 
-    if len(square) != 2 or square[0] not in colDict or square[1] not in rowDict:
+    coord = _SQUARE_COORDS.get(square)
+    if coord is None:
         raise ValueError(f'Invalid Coordinate in function coorToNum: {square}')
-
-    return (rowDict[square[1]], colDict[square[0]])
+    return coord
 
 
 def coordToSquare(coord: Coord) -> str:
     """Converts a (row, col) tuple to the corresponding square location"""
-    rowDict = {0: '8', 1: '7', 2: '6', 3: '5', 4: '4', 5: '3', 6: '2', 7: '1'}
-    colDict = {0: 'a', 1: 'b', 2: 'c', 3: 'd', 4: 'e', 5: 'f', 6: 'g', 7: 'h'}
 
-    if coord[0] not in rowDict or coord[1] not in colDict:
+    name = _COORD_NAMES.get(tuple(coord))
+    if name is None:
         raise ValueError('Invalid row,col array in function numToCoor')
+    return name
+
+
+def placementToFEN(squares: list[int]) -> str:
+    """Writes the piece placement field from a list of piece codes (a8 first)"""
+
+    chars = ''.join([_CODE_CHARS[code] for code in squares])
+    placement = '/'.join([chars[start:start + NUM_COLS]
+                          for start in range(0, NUM_SQUARES, NUM_COLS)])
+    for run, digit in _EMPTY_RUNS:
+        placement = placement.replace(run, digit)
+    return placement
+
+
+def placementFromFEN(placement: str) -> list[int]:
+    """Reads the piece placement field into a list of piece codes (a8 first)"""
+
+    # expanded row by row: a long row next to a short one must not add up to 64
+    rows = [row.translate(_EXPAND_DIGITS) for row in placement.split('/')]
+    if len(rows) != NUM_ROWS or any(len(row) != NUM_COLS for row in rows):
+        raise ValueError(f'Invalid piece placement in FEN: {placement}')
+    expanded = ''.join(rows)
+    try:
+        return [_CHAR_CODES[char] for char in expanded]
+    except KeyError as error:
+        raise ValueError(f'Invalid piece placement in FEN: {placement}') from error
+
+
+def castleToFEN(castleRights: CastleRights) -> str:
+    """Writes the castling availability field ('KQkq', '-', ...)"""
+
+    castleStr = ''.join([char for color, side, char in _CASTLE_CHARS if castleRights[color][side]])
+    return castleStr or '-'
+
+
+def castleFromFEN(castleStr: str) -> CastleRights:
+    """Reads the castling availability field"""
+
+    return {color: {side: char in castleStr
+                    for owner, side, char in _CASTLE_CHARS if owner == color}
+            for color in ColorChar}
+
+
+def formatFEN(squares: list[int], toMove: ColorChar, castleRights: CastleRights,
+              epTarget: (Coord | None), halfMoveClock: int, fullMoveNumber: int) -> str:
+    """Writes a full FEN string"""
+
+    epStr = '-' if epTarget is None else _COORD_NAMES[epTarget]
+    return f'{placementToFEN(squares)} {toMove.value} {castleToFEN(castleRights)} {epStr} ' \
+        f'{halfMoveClock} {fullMoveNumber}'
+
+
+def parseFEN(fen: str) -> FENFields:
+    """Reads a full FEN string. The move counters may be left off, as some sources do."""
 
-    return colDict[coord[1]] + rowDict[coord[0]]
+    fields = fen.split()
+    if len(fields) not in (4, 6):
+        raise ValueError(f'Invalid FEN: {fen}')
+    if len(fields) == 4:
+        fields += ['0', '1']
 
+    placement, toMove, castleStr, epStr, halfMoveClock, fullMoveNumber = fields
+    return FENFields(placementFromFEN(placement), ColorChar(toMove), castleFromFEN(castleStr),
+                     None if epStr == '-' else squareToCoord(epStr),
+                     int(halfMoveClock), int(fullMoveNumber))
 
@@ -0,0 +1,160 @@
+#!/bin/python3
+# magics.py
+
+"""
+Magic bitboard attack lookup for rooks and bishops.
+
+For each square, only the occupancy of the squares a slider could be blocked on
+matters (its rays, minus the board edge). Multiplying that masked occupancy by a
+per-square "magic" number and keeping the top bits gives a collision-free index
+into a table of precomputed attack sets, so a slider's attacks cost one lookup:
+
+    table[square][((occupied & mask) * magic & FULL) >> shift]
+
+Each table gets one index bit more than the mask strictly needs. That doubles
+its size but makes a working magic roughly twenty times easier to find, which
+matters with the search running in Python.
+
+The magic numbers are found by a seeded random search, so every run produces the
+same ones. The search and table build still take a moment, so the result is
+cached to disk (CACHE_PATH) and reloaded on later runs.
+"""
+
+import os
+import pickle
+import random
+
+import bitboard
+from bitboard import NUM_SQUARES, FULL
+import attackTables as tables
+
+CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'magics.cache')
+CACHE_VERSION = 1
+SEED = 20220728
+SPARE_INDEX_BITS = 1
+
+# anything that changes the generated tables must invalidate the cache
+_CACHE_KEY = (CACHE_VERSION, SEED, SPARE_INDEX_BITS)
+
+
+def _relevantMask(square: int, directions: range) -> int:
+    """The squares along the slider's rays whose occupancy can change its attacks"""
+
+    mask = 0
+    for index in directions:
+        ray = tables.RAYS[index][square]
+        # the last square of each ray is attacked whether or not it is occupied
+        if ray:
+            last = bitboard.lowestSquare(ray) if tables.DIRECTIONS[index][0] < 0 \
+                else ray.bit_length() - 1
+            ray ^= bitboard.bit(last)
+        mask |= ray
+    return mask
+
+
+def _subsets(mask: int) -> list[int]:
+    """Every subset of the mask's squares (Carry-Rippler enumeration)"""
+
+    subsets = []
+    subset = 0
+    while True:
+        subsets.append(subset)
+        subset = (subset - mask) & mask
+        if subset == 0:
+            return subsets
+
+
+def _findMagic(mask: int, occupancies: list[int], attacks: list[int],
+               rng: random.Random) -> tuple[int, int, list[int]]:
+    shift = NUM_SQUARES - bitboard.popCount(mask) - SPARE_INDEX_BITS
+    size = 1 << (NUM_SQUARES - shift)
+
+    # filledIn[i] == attempt marks table[i] as written during this attempt,
+    # which saves clearing the table between attempts
+    table = [0] * size
+    filledIn = [0] * size
+    attempt = 0
+    while True:
+        # sparse candidates are far more likely to work
+        magic = rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64)
+        if bitboard.popCount(((mask * magic) & FULL) >> 56) < 6:
+            continue
+
+        attempt += 1
+        for occupancy, attack in zip(occupancies, attacks):
+            index = ((occupancy * magic) & FULL) >> shift
+            if filledIn[index] != attempt:
+                filledIn[index] = attempt
+                table[index] = attack
+            elif table[index] != attack:
+                break
+        else:
+            lookup = [attack if filledIn[i] == attempt else 0 for i, attack in enumerate(table)]
+            return magic, shift, lookup
+
+
+def _build() -> dict:
+    rng = random.Random(SEED)
+    result = {'key': _CACHE_KEY}
+
+    for name, directions, reference in (('rook', range(0, 4), tables.rookAttacks),
+                                        ('bishop', range(4, 8), tables.bishopAttacks)):
+        masks, magicNumbers, shifts, lookups = [], [], [], []
+        for square in range(NUM_SQUARES):
+            mask = _relevantMask(square, directions)
+            occupancies = _subsets(mask)
+            attacks = [reference(square, occupancy) for occupancy in occupancies]
+            magic, shift, lookup = _findMagic(mask, occupancies, attacks, rng)
+
+            masks.append(mask)
+            magicNumbers.append(magic)
+            shifts.append(shift)
+            lookups.append(lookup)
+
+        result[name] = (masks, magicNumbers, shifts, lookups)
+
+    return result
+
+
+def _load() -> dict:
+    try:
+        with open(CACHE_PATH, 'rb') as cacheFile:
+            cached = pickle.load(cacheFile)
+        if cached.get('key') == _CACHE_KEY:
+            return cached
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError):
+        pass
+
+    built = _build()
+    try:
+        with open(CACHE_PATH, 'wb') as cacheFile:
+            pickle.dump(built, cacheFile, protocol=pickle.HIGHEST_PROTOCOL)
+    except OSError:
+        # a read-only install still works, it just rebuilds next time
+        pass
+    return built
+
+
+_TABLES = _load()
+ROOK_MASKS, ROOK_MAGICS, ROOK_SHIFTS, ROOK_LOOKUP = _TABLES['rook']
+BISHOP_MASKS, BISHOP_MAGICS, BISHOP_SHIFTS, BISHOP_LOOKUP = _TABLES['bishop']
+
+
+def rookAttacks(square: int, occupied: int) -> int:
+    """Squares a rook on square attacks given the board occupancy"""
+
+    return ROOK_LOOKUP[square][
+        ((occupied & ROOK_MASKS[square]) * ROOK_MAGICS[square] & FULL) >> ROOK_SHIFTS[square]]
+
+
+def bishopAttacks(square: int, occupied: int) -> int:
+    """Squares a bishop on square attacks given the board occupancy"""
+
+    return BISHOP_LOOKUP[square][
+        ((occupied & BISHOP_MASKS[square]) * BISHOP_MAGICS[square] & FULL) >> BISHOP_SHIFTS[square]]
+
+
+def queenAttacks(square: int, occupied: int) -> int:
+    """Squares a queen on square attacks given the board occupancy"""
+
+    return rookAttacks(square, occupied) | bishopAttacks(square, occupied)
@@ -0,0 +1,133 @@
+#!/bin/python3
+# moveOrdering.py
+
+"""
+Move ordering for the search.
+
+Alpha-beta prunes the most when the best move is searched first, so the moves
+of each stage of Position.iterMoves are sorted by a key from MoveOrderer:
+
+- captures by most valuable victim, then least valuable attacker (MVV-LVA),
+  using the piece values from chessPiece; promotions add the promoted piece
+- quiet moves by the killer moves of the ply (quiet moves that caused a cutoff
+  in a sibling node), then by the butterfly history table: a score per side,
+  start square and end square, raised whenever the move causes a cutoff
+
+The orderer also counts how often a cutoff came from the first move searched,
+which is the usual measure of how well the ordering works (above 90% is good).
+"""
+
+from array import array
+from typing import Callable
+
+from chessMove import NULL_MOVE, CAPTURE_BIT, PROMOTION_BIT, EP_CAPTURE, PROMOTION_PIECES
+from chessPiece import PIECE_VALUES, PIECE_CLASSES, TYPE_MASK, PAWN, KING, QUEEN, COLOR_INDEX
+from chessPosition import Position
+
+NUM_KILLERS = 2
+
+# the king has no material value, but as an attacker it should come last
+KING_ATTACKER_VALUE = 2 * PIECE_VALUES[QUEEN]
+
+# history scores are halved once one passes this, keeping them below KILLER_SCORE
+HISTORY_LIMIT = 1 << 20
+KILLER_SCORE = 1 << 22
+
+# piece code -> value when capturing and when being captured
+_ATTACKER_VALUES = [KING_ATTACKER_VALUE if code & TYPE_MASK == KING else value
+                    for code, value in enumerate(PIECE_VALUES)]
+_VICTIM_VALUES = PIECE_VALUES
+_EP_VICTIM_VALUE = PIECE_VALUES[PAWN]    # the captured pawn is not on the end square
+
+# promotion index (see chessMove.PROMOTION_PIECES) -> value gained
+_PROMOTION_VALUES = tuple(PIECE_CLASSES[pieceChar].value for pieceChar in PROMOTION_PIECES)
+
+# victims weigh more than any attacker can
+_VICTIM_WEIGHT = KING_ATTACKER_VALUE + 1
+
+
+class MoveOrderer:
+    """Killer slots, history table and capture scoring for one Searcher"""
+
+    cutoffs: int
+    firstMoveCutoffs: int
+
+    _killers: list[array]   # _killers[ply] holds NUM_KILLERS packed moves
+    _history: array         # indexed by color index << 12 | start << 6 | end
+
+    def __init__(self, maxPly: int):
+        """
+        Args:
+            maxPly (int): the deepest ply the search can reach
+        """
+        self._killers = [array('H', [NULL_MOVE] * NUM_KILLERS) for _ in range(maxPly + 1)]
+        self._history = array('l', [0]) * (2 * 64 * 64)
+        self.resetStats()
+
+    def resetStats(self):
+        """Zeroes the cutoff counters"""
+
+        self.cutoffs = 0
+        self.firstMoveCutoffs = 0
+
+    @property
+    def firstMoveCutoffRate(self) -> float:
+        """Fraction of the cutoffs that came from the first move searched"""
+
+        return self.firstMoveCutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    def newSearch(self):
+        """Forgets the killers and fades the history before searching a new position"""
+
+        for killers in self._killers:
+            for slot in range(NUM_KILLERS):
+                killers[slot] = NULL_MOVE
+        history = self._history
+        for index in range(len(history)):
+            history[index] >>= 1
+        self.resetStats()
+
+    def sortKey(self, position: Position, ply: int) -> Callable[[int], int]:
+        """Returns the key to sort the moves of the position (at this ply) by"""
+
+        pieceCodeAt = position.pieceCodeAt
+        killers = self._killers[ply]
+        history = self._history
+        colorOffset = COLOR_INDEX[position.toMove] << 12
+
+        def key(code: int) -> int:
+            if code & (CAPTURE_BIT | PROMOTION_BIT):
+                victim = _EP_VICTIM_VALUE if code >> 12 == EP_CAPTURE \
+                    else _VICTIM_VALUES[pieceCodeAt((code >> 6) & 0x3F)]
+                score = victim * _VICTIM_WEIGHT - _ATTACKER_VALUES[pieceCodeAt(code & 0x3F)]
+                if code & PROMOTION_BIT:
+                    score += _PROMOTION_VALUES[(code >> 12) & 3] * _VICTIM_WEIGHT
+                return score
+            if code == killers[0]:
+                return KILLER_SCORE + 1
+            if code in killers:
+                return KILLER_SCORE
+            return history[colorOffset | (code & 0xFFF)]
+
+        return key
+
+    def recordCutoff(self, position: Position, code: int, depth: int, ply: int, moveNumber: int):
+        """Notes that the move (the moveNumber-th searched, from 0) failed high"""
+
+        self.cutoffs += 1
+        if moveNumber == 0:
+            self.firstMoveCutoffs += 1
+        if code & (CAPTURE_BIT | PROMOTION_BIT):
+            return
+
+        killers = self._killers[ply]
+        if killers[0] != code:
+            killers[1] = killers[0]
+            killers[0] = code
+
+        history = self._history
+        index = COLOR_INDEX[position.toMove] << 12 | (code & 0xFFF)
+        history[index] += depth * depth
+        if history[index] > HISTORY_LIMIT:
+            for other in range(len(history)):
+                history[other] >>= 1
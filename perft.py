@@ -0,0 +1,221 @@
+#!/bin/python3
+# perft.py
+
+"""
+Perft benchmark and correctness check for the move generator.
+
+Counts the legal move tree of well-known positions and compares each count to its
+published value, reporting nodes per second. Any mismatch makes the run fail.
+Results are also written as JSON so speed can be compared across revisions.
+
+Deep counts can be spread over a process pool with --workers: the tree is split
+into the subtrees below the first --split-depth plies, each worker is sent the FEN
+of a subtree root, and the counts are merged back per root move.
+
+Usage:
+    python perft.py                      # every reference position to depth 3
+    python perft.py --depth 4 kiwipete   # selected positions, deeper
+    python perft.py --fen "<FEN>" --depth 3 --divide
+    python perft.py --depth 5 --workers 0 start   # 0 workers = one per CPU
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from chessPosition import Position
+from fen import STANDARD_START_POSITION
+
+# name -> (FEN, published node counts for depth 1, 2, ...)
+# https://www.chessprogramming.org/Perft_Results
+REFERENCE_POSITIONS: dict[str, tuple[str, list[int]]] = {
+    'start': (
+        STANDARD_START_POSITION,
+        [20, 400, 8902, 197281, 4865609, 119060324]),
+    'kiwipete': (
+        'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+        [48, 2039, 97862, 4085603, 193690690]),
+    'position3': (
+        '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+        [14, 191, 2812, 43238, 674624, 11030083]),
+    'position4': (
+        'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+        [6, 264, 9467, 422333, 15833292]),
+    'position4mirrored': (
+        'r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1',
+        [6, 264, 9467, 422333, 15833292]),
+    'position5': (
+        'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+        [44, 1486, 62379, 2103487, 89941194]),
+    'position6': (
+        'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+        [46, 2079, 89890, 3894594, 164075551]),
+}
+
+DEFAULT_DEPTH = 3
+DEFAULT_OUTPUT = 'perft_results.json'
+DEFAULT_SPLIT_DEPTH = 2
+
+# (root move, FEN of the subtree root, depth left to count below it)
+SubtreeTask = tuple[str, str, int]
+
+
+def runPerft(fen: str, depth: int, workers: int = 1,
+             splitDepth: int = DEFAULT_SPLIT_DEPTH) -> tuple[int, float]:
+    """Returns the perft node count of the position and the (wall-clock) seconds it took"""
+
+    start = time.perf_counter()
+    if workers > 1 and depth > 1:
+        nodes = sum(parallelDivide(fen, depth, workers, splitDepth).values())
+    else:
+        nodes = Position(fen).perft(depth)
+    return nodes, time.perf_counter() - start
+
+
+def parallelDivide(fen: str, depth: int, workers: int,
+                   splitDepth: int = DEFAULT_SPLIT_DEPTH) -> dict[str, int]:
+    """Position.divide(depth), with the subtrees counted across a process pool
+
+    Splitting below the first two plies rather than only the root gives a few
+    hundred similarly sized jobs instead of a few dozen uneven ones, so all the
+    workers stay busy until the end.
+    """
+    position = Position(fen)
+    counts = {move.toCoordinateNotation(): 0 for move in position.getLegalMoves(position.toMove)}
+    if depth <= 1:
+        # as in Position.divide: each root move is one leaf (perft of depth 0 or less)
+        return {move: 1 for move in counts}
+
+    tasks: list[SubtreeTask] = []
+    _splitTree(position, depth, min(splitDepth, depth - 1), '', tasks)
+
+    chunkSize = max(1, len(tasks) // (workers * 8))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for rootMove, nodes in executor.map(_countSubtree, tasks, chunksize=chunkSize):
+            counts[rootMove] += nodes
+    return counts
+
+
+def _splitTree(position: Position, depth: int, plies: int, rootMove: str,
+               tasks: list[SubtreeTask]):
+    for move in position.getLegalMoves(position.toMove):
+        position.makeMove(move)
+        root = rootMove or move.toCoordinateNotation()
+        if plies == 1:
+            tasks.append((root, position.fenStr, depth - 1))
+        else:
+            _splitTree(position, depth - 1, plies - 1, root, tasks)
+        position.unmakeMove()
+
+
+def _countSubtree(task: SubtreeTask) -> tuple[str, int]:
+    rootMove, fen, depth = task
+    return rootMove, Position(fen).perft(depth)
+
+
+def _revision() -> (str | None):
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _printDivide(fen: str, depth: int, workers: int, splitDepth: int):
+    if workers > 1:
+        counts = parallelDivide(fen, depth, workers, splitDepth)
+    else:
+        counts = Position(fen).divide(depth)
+    for move, nodes in sorted(counts.items()):
+        print(f'{move}: {nodes}')
+    print(f'\nMoves: {len(counts)}\nNodes: {sum(counts.values())}')
+
+
+def main(argv: (list[str] | None) = None) -> int:
+    """Runs the benchmark; returns the process exit code (1 on any mismatch)"""
+
+    parser = argparse.ArgumentParser(description='Perft benchmark for the move generator')
+    parser.add_argument('positions', nargs='*',
+                        help='reference positions to run (default: all): '
+                             + ', '.join(REFERENCE_POSITIONS))
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH,
+                        help=f'maximum depth (default: {DEFAULT_DEPTH})')
+    parser.add_argument('--fen', help='run a custom position instead (no reference counts)')
+    parser.add_argument('--divide', action='store_true',
+                        help='with --fen, print the node count under each root move')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help=f'JSON results file (default: {DEFAULT_OUTPUT})')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='processes to count with (default: 1, 0: one per CPU)')
+    parser.add_argument('--split-depth', type=int, default=DEFAULT_SPLIT_DEPTH,
+                        help='plies to expand before handing subtrees to workers '
+                             f'(default: {DEFAULT_SPLIT_DEPTH})')
+    args = parser.parse_args(argv)
+
+    if args.depth < 1:
+        parser.error('--depth must be at least 1')
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+
+    unknown = [name for name in args.positions if name not in REFERENCE_POSITIONS]
+    if unknown:
+        parser.error(f'unknown position(s): {", ".join(unknown)}')
+
+    if args.fen and args.divide:
+        _printDivide(args.fen, args.depth, workers, args.split_depth)
+        return 0
+
+    if args.fen:
+        jobs = [('custom', args.fen, args.depth, None)]
+    else:
+        jobs = []
+        for name in args.positions or REFERENCE_POSITIONS:
+            fen, counts = REFERENCE_POSITIONS[name]
+            depth = min(args.depth, len(counts))
+            jobs.append((name, fen, depth, counts[depth - 1]))
+
+    results = []
+    failed = False
+    for name, fen, depth, expected in jobs:
+        nodes, seconds = runPerft(fen, depth, workers, args.split_depth)
+        nps = nodes / seconds if seconds > 0 else 0.0
+        ok = expected is None or nodes == expected
+        failed = failed or not ok
+
+        status = 'ok' if ok else f'MISMATCH (expected {expected})'
+        print(f'{name:<18} depth {depth}  {nodes:>12} nodes  {seconds:8.2f} s  '
+              f'{nps:>10.0f} nps  {status}')
+        results.append({'name': name, 'fen': fen, 'depth': depth, 'nodes': nodes,
+                        'expected': expected, 'seconds': seconds, 'nps': nps, 'ok': ok})
+
+    totalNodes = sum(result['nodes'] for result in results)
+    totalSeconds = sum(result['seconds'] for result in results)
+    totalNps = totalNodes / totalSeconds if totalSeconds > 0 else 0.0
+    print(f'{"total":<18}          {totalNodes:>12} nodes  {totalSeconds:8.2f} s  '
+          f'{totalNps:>10.0f} nps')
+
+    report = {
+        'revision': _revision(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'workers': workers,
+        'results': results,
+        'totalNodes': totalNodes,
+        'totalSeconds': totalSeconds,
+        'nps': totalNps,
+        'ok': not failed,
+    }
+    with open(args.output, 'w', encoding='utf-8') as outFile:
+        json.dump(report, outFile, indent=2)
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,207 @@
+#!/bin/python3
+# pgn.py
+
+"""
+Streaming reader for Portable Game Notation (PGN) files.
+
+readGames yields one game at a time while reading the file line by line, so a
+collection of any size can be replayed without loading it into memory. Tag
+pairs, {comments}, ; comments, (variations), NAGs, move numbers and results are
+understood; the moves of the main line are resolved against a Position into
+chessMove objects. With resolveMoves=False the movetext is only skimmed for
+comments, variations and results, which makes tag-only scans much cheaper
+while finding the same games and results.
+
+Games written by AI_Game (a FEN tag followed directly by the movetext, with no
+result token) are read too: a tag line after movetext starts the next game.
+"""
+
+import re
+from typing import Iterator, NamedTuple, TextIO
+
+from typedefs import PieceChar, PositionStatus
+from fen import STANDARD_START_POSITION, SQUARE_NAMES
+from chessMove import Move, KING_CASTLE, QUEEN_CASTLE, PROMOTION, PROMOTION_PIECES
+from chessPiece import PIECE_CLASSES, PAWN, TYPE_MASK
+from chessPosition import Position
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+
+_TAG_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+_TOKEN_RE = re.compile(r'[{};()]|\$\d+|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s{};()$]+')
+# only what delimits comments, variations and games, for skimming movetext
+_SKIM_RE = re.compile(r'[{};()*]|(?<![\w/-])(?:1-0|0-1|1/2-1/2)(?![\w/-])')
+_SAN_RE = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?')
+
+_SQUARES = {name: square for square, name in enumerate(SQUARE_NAMES)}
+_PIECE_TYPES = {pieceChar.value.upper(): cls.typeCode for pieceChar, cls in PIECE_CLASSES.items()}
+
+
+class PGNGame(NamedTuple):
+    """One game read from a PGN file"""
+
+    tags: dict[str, str]
+    sanMoves: list[str]         # main line only
+    moves: list[Move]           # sanMoves resolved (empty when moves were not resolved)
+    result: (str | None)        # the termination token, else the Result tag
+    error: (str | None)         # why resolving stopped early, if it did
+
+
+def readGames(source: (str | TextIO), resolveMoves: bool = True) -> Iterator[PGNGame]:
+    """Generator of the games in a PGN file (a path or an open text file)
+
+    Args:
+        source: the file to read
+        resolveMoves (bool): whether to parse the movetext and replay it; with
+            False only the tags (and Result tag) of each game are returned
+    """
+    if isinstance(source, str):
+        # utf-8-sig drops a leading byte order mark, which would hide the first tag
+        with open(source, encoding='utf-8-sig', errors='replace') as pgnFile:
+            yield from readGames(pgnFile, resolveMoves)
+        return
+
+    tags: dict[str, str] = {}
+    sanMoves: list[str] = []
+    result = None
+    inMovetext = False
+    inComment = False
+    depth = 0
+    tokenRE = _TOKEN_RE if resolveMoves else _SKIM_RE
+
+    for number, line in enumerate(source):
+        if number == 0:
+            line = line.removeprefix('\ufeff')
+        if not inComment:
+            stripped = line.lstrip()
+            if stripped.startswith('['):
+                if inMovetext:
+                    yield _finishGame(tags, sanMoves, result, resolveMoves)
+                    tags, sanMoves, result, inMovetext, depth = {}, [], None, False, 0
+                match = _TAG_RE.match(stripped)
+                if match:
+                    tags[match.group(1)] = match.group(2).replace('\\"', '"')
+                continue
+            if not stripped or stripped.startswith('%'):
+                continue
+
+        inMovetext = True
+        pos = 0
+        while True:
+            if inComment:
+                close = line.find('}', pos)
+                if close < 0:
+                    break
+                inComment = False
+                pos = close + 1
+
+            match = tokenRE.search(line, pos)
+            if match is None:
+                break
+            token = match.group()
+            pos = match.end()
+
+            if token == '{':
+                inComment = True
+            elif token == ';':
+                break
+            elif token == '(':
+                depth += 1
+            elif token == ')':
+                depth = max(0, depth - 1)
+            elif token in RESULTS:
+                if depth == 0:
+                    yield _finishGame(tags, sanMoves, token, resolveMoves)
+                    tags, sanMoves, result = {}, [], None
+                    # the next game may start on the same line
+                    inMovetext = bool(line[pos:].strip())
+            elif token[0] == '$' or token[-1] == '.':
+                continue
+            elif depth == 0:
+                sanMoves.append(token)
+
+    if tags or inMovetext:
+        yield _finishGame(tags, sanMoves, result, resolveMoves)
+
+
+def _finishGame(tags: dict[str, str], sanMoves: list[str], result: (str | None),
+                resolveMoves: bool) -> PGNGame:
+    if result is None:
+        result = tags.get('Result')
+    if not resolveMoves:
+        return PGNGame(tags, sanMoves, [], result, None)
+
+    fen = tags.get('FEN', STANDARD_START_POSITION)
+    try:
+        position = Position(fen)
+    except ValueError as exception:
+        return PGNGame(tags, sanMoves, [], result, f'bad FEN: {exception}')
+    # e.g. a missing king, which the move generator cannot handle
+    if position.getPositionStatus() == PositionStatus.INVALID:
+        return PGNGame(tags, sanMoves, [], result, f'invalid position: {fen}')
+
+    moves = []
+    error = None
+    for number, san in enumerate(sanMoves):
+        try:
+            code = sanToCode(position, san)
+        except ValueError as exception:
+            error = f'ply {number + 1}: {exception}'
+            break
+        moves.append(position.decodeMove(code))
+        position.makeMoveCode(code)
+
+    return PGNGame(tags, sanMoves, moves, result, error)
+
+
+def sanToMove(position: Position, san: str) -> Move:
+    """Returns the legal move of the side to move that the SAN string describes"""
+
+    return position.decodeMove(sanToCode(position, san))
+
+
+def sanToCode(position: Position, san: str) -> int:
+    """sanToMove returning the packed move (see chessMove)"""
+
+    text = san.rstrip('+#!?').removesuffix('e.p.').strip()
+    legal = position.getLegalMoveCodes(position.toMove)
+
+    castle = {'O-O': KING_CASTLE, '0-0': KING_CASTLE,
+              'O-O-O': QUEEN_CASTLE, '0-0-0': QUEEN_CASTLE}.get(text)
+    if castle is not None:
+        for code in legal:
+            if code >> 12 == castle:
+                return code
+        raise ValueError(f'illegal move {san}')
+
+    match = _SAN_RE.fullmatch(text)
+    if match is None:
+        raise ValueError(f'unreadable move {san}')
+    pieceLetter, fromFile, fromRank, toSquare, promotion = match.groups()
+
+    pieceType = _PIECE_TYPES[pieceLetter] if pieceLetter else PAWN
+    end = _SQUARES[toSquare]
+    promotionIndex = None if promotion is None \
+        else PROMOTION_PIECES.index(PieceChar(promotion.lower()))
+
+    found = []
+    for code in legal:
+        if (code >> 6) & 0x3F != end:
+            continue
+        start = code & 0x3F
+        if position.pieceCodeAt(start) & TYPE_MASK != pieceType:
+            continue
+        startName = SQUARE_NAMES[start]
+        if (fromFile and startName[0] != fromFile) or (fromRank and startName[1] != fromRank):
+            continue
+        isPromotion = code >> 12 >= PROMOTION
+        if isPromotion != (promotionIndex is not None) \
+                or (isPromotion and (code >> 12) & 3 != promotionIndex):
+            continue
+        found.append(code)
+
+    if not found:
+        raise ValueError(f'illegal move {san}')
+    if len(found) > 1:
+        raise ValueError(f'ambiguous move {san}')
+    return found[0]
@@ -0,0 +1,164 @@
+#!/bin/python3
+# transpositionTable.py
+
+"""
+Fixed-size transposition table for the search, keyed by Position.zobristKey.
+
+Entries live in two preallocated array('Q') columns, one for the keys and one
+for the packed data:
+
+    bits  0-15  best move (packed, see chessMove)
+    bits 16-23  depth searched
+    bits 24-25  bound (EXACT, LOWER or UPPER)
+    bits 26-31  age: the search (game move) that wrote the entry, modulo 64
+    bits 32-63  score, offset to be non-negative
+
+Entries are grouped in buckets of two. The first slot is depth-preferred: it
+keeps the deepest result of the current search. The second slot always takes
+whatever the first slot turned away, so recent results are never lost. Entries
+left over from earlier searches count as empty for replacement, which is how
+the table ages across moves without being cleared.
+"""
+
+from array import array
+from typing import NamedTuple
+
+from chessMove import NULL_MOVE
+
+DEFAULT_MEGABYTES = 16
+
+EXACT = 0   # score is the node's value
+LOWER = 1   # score is a lower bound (the search failed high)
+UPPER = 2   # score is an upper bound (the search failed low)
+
+ENTRY_BYTES = 16    # one key and one data word
+BUCKET_SIZE = 2
+
+_AGE_MASK = 0x3F
+_SCORE_OFFSET = 1 << 31
+
+
+class TTEntry(NamedTuple):
+    """What the table remembers about a position"""
+
+    move: int       # packed (NULL_MOVE if none)
+    depth: int
+    score: int
+    bound: int
+
+
+class TranspositionTable:
+    """Bounded, array-backed hash table of search results"""
+
+    probes: int
+    hits: int
+    stores: int
+    overwrites: int     # stores that replaced a different current-search position
+
+    _keys: array
+    _data: array
+    _bucketMask: int
+    _age: int
+
+    def __init__(self, megabytes: float = DEFAULT_MEGABYTES):
+        self._age = 0
+        self.resize(megabytes)
+
+    def resize(self, megabytes: float):
+        """Reallocates the table to fit in the given budget (which clears it)"""
+
+        entries = max(BUCKET_SIZE, int(megabytes * (1 << 20)) // ENTRY_BYTES)
+        # a power-of-two bucket count lets the key be masked instead of divided
+        buckets = 1 << ((entries // BUCKET_SIZE).bit_length() - 1)
+        self._bucketMask = buckets - 1
+        self._keys = array('Q', bytes(8 * buckets * BUCKET_SIZE))
+        self._data = array('Q', bytes(8 * buckets * BUCKET_SIZE))
+        self.resetStats()
+
+    def clear(self):
+        """Forgets every entry"""
+
+        self.resize(self.megabytes)
+
+    def newSearch(self):
+        """Marks the start of a new search; older entries become replaceable"""
+
+        self._age = (self._age + 1) & _AGE_MASK
+
+    def resetStats(self):
+        """Zeroes the probe / hit / store counters"""
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.overwrites = 0
+
+    @property
+    def size(self) -> int:
+        """The number of entries the table holds"""
+
+        return len(self._keys)
+
+    @property
+    def megabytes(self) -> float:
+        """Memory used by the entries"""
+
+        return self.size * ENTRY_BYTES / (1 << 20)
+
+    @property
+    def hitRate(self) -> float:
+        """Fraction of probes that found their position"""
+
+        return self.hits / self.probes if self.probes else 0.0
+
+    def usage(self, sample: int = 1000) -> float:
+        """Fraction of (a sample of) the slots holding an entry from the current search"""
+
+        sample = min(sample, self.size)
+        used = sum(1 for index in range(sample)
+                   if self._keys[index] and (self._data[index] >> 26) & _AGE_MASK == self._age)
+        return used / sample
+
+    def probe(self, key: int) -> (TTEntry | None):
+        """Returns the stored entry for the position hash, or None"""
+
+        self.probes += 1
+        index = (key & self._bucketMask) * BUCKET_SIZE
+        keys = self._keys
+        if keys[index] == key:
+            data = self._data[index]
+        elif keys[index + 1] == key:
+            data = self._data[index + 1]
+        else:
+            return None
+
+        self.hits += 1
+        return TTEntry(data & 0xFFFF, (data >> 16) & 0xFF, (data >> 32) - _SCORE_OFFSET,
+                       (data >> 24) & 3)
+
+    def store(self, key: int, move: int, depth: int, score: int, bound: int):
+        """Records a search result for the position hash"""
+
+        self.stores += 1
+        index = (key & self._bucketMask) * BUCKET_SIZE
+        keys = self._keys
+        data = self._data
+
+        # depth-preferred slot: same position, stale entry, or at least as deep
+        current = data[index]
+        if keys[index] == key or keys[index] == 0 \
+                or (current >> 26) & _AGE_MASK != self._age or depth >= (current >> 16) & 0xFF:
+            if keys[index] == key and move == NULL_MOVE:
+                # keep the best move found by an earlier search of this position
+                move = current & 0xFFFF
+        else:
+            index += 1
+            if keys[index] == key and move == NULL_MOVE:
+                move = data[index] & 0xFFFF
+
+        if keys[index] not in (0, key) and (data[index] >> 26) & _AGE_MASK == self._age:
+            self.overwrites += 1
+
+        keys[index] = key
+        data[index] = move | (min(depth, 0xFF) << 16) | (bound << 24) | (self._age << 26) \
+            | ((score + _SCORE_OFFSET) << 32)
@@ -0,0 +1,60 @@
+#!/bin/python3
+# zobrist.py
+
+"""
+Random keys for Zobrist hashing of positions.
+
+A position's key is the XOR of one key per (color, piece, square) on the board,
+plus keys for black to move, each castling right still held and the file of the
+en passant target. Because XOR is its own inverse, a move updates the key by
+XOR-ing out what changed and XOR-ing in the replacement, without looking at the
+rest of the board.
+
+The keys come from a seeded generator so they are the same on every run, which
+keeps hashes comparable across processes and saved files.
+"""
+
+import random
+
+from typedefs import PieceChar, ColorChar, Coord
+from bitboard import NUM_SQUARES, NUM_COLS
+from chessPiece import PIECES
+
+SEED = 0x5EED_B0B0
+
+_rng = random.Random(SEED)
+
+PIECE_KEYS: dict[ColorChar, dict[PieceChar, list[int]]] = {
+    color: {pieceChar: [_rng.getrandbits(64) for _ in range(NUM_SQUARES)]
+            for pieceChar in PieceChar}
+    for color in ColorChar
+}
+BLACK_TO_MOVE = _rng.getrandbits(64)
+CASTLE_KEYS: dict[ColorChar, dict[PieceChar, int]] = {
+    color: {side: _rng.getrandbits(64) for side in (PieceChar.KING, PieceChar.QUEEN)}
+    for color in ColorChar
+}
+EP_FILE_KEYS = [_rng.getrandbits(64) for _ in range(NUM_COLS)]
+
+# the same keys indexed by piece code (see chessPiece); EMPTY hashes to nothing
+CODE_KEYS: list[list[int]] = [
+    [0] * NUM_SQUARES if piece is None else PIECE_KEYS[piece.color][piece.char]
+    for piece in PIECES
+]
+
+
+def castleKey(castleRights: dict[ColorChar, dict[PieceChar, bool]]) -> int:
+    """Returns the combined key of every castling right still held"""
+
+    key = 0
+    for color, rights in castleRights.items():
+        for side, allowed in rights.items():
+            if allowed:
+                key ^= CASTLE_KEYS[color][side]
+    return key
+
+
+def epKey(epTarget: (Coord | None)) -> int:
+    """Returns the key for the en passant target square (0 when there is none)"""
+
+    return 0 if epTarget is None else EP_FILE_KEYS[epTarget[1]]